@@ -2,9 +2,36 @@ import pandas as pd
 import requests
 import os
 import re
+import threading
 import time
 import argparse
+import contextlib
+from canvas_bulkflow_bandwidth import limiter_from_settings, parse_rate
 from canvas_bulkflow_config import load_env_file
+from canvas_bulkflow_feeder import DEFAULT_OCR_FOLDER_NAME, HotFolderFeeder
+from canvas_bulkflow_layout import DEFAULT_LAYOUT, LAYOUTS, ShardFolders, run_file_path, run_files_folder, shard_subdir
+from canvas_bulkflow_manifest import DEFAULT_MANIFEST_FILENAME, MANIFEST_SIZE_COLUMN, DownloadManifest
+from canvas_bulkflow_metadata import DEFAULT_COURSE_ID_COLUMN, MetadataResolver
+from canvas_bulkflow_profiler import DEFAULT_PROFILE_FOLDER_NAME, JobProfiler, default_profile_folder
+from canvas_bulkflow_retry import (
+    RetryQueue,
+    TransientTransferError,
+    raise_for_transient_exception,
+    raise_for_transient_status,
+)
+from canvas_bulkflow_scheduler import DEFAULT_ORDER, DEFAULT_WORKERS, ORDERS, WorkRunner, order_work
+from canvas_bulkflow_shard import format_shard, parse_shard, shard_mask
+from canvas_bulkflow_snapshot import DEFAULT_CHANGES_FILENAME, DEFAULT_SNAPSHOT_FILENAME, ReportSnapshot
+from canvas_bulkflow_textlayer import (
+    DEFAULT_HAS_TEXT_FOLDER,
+    DEFAULT_WORKERS as DEFAULT_TEXT_WORKERS,
+    HAS_TEXT_LIST_FILENAME,
+    TextLayerSorter,
+    default_has_text_folder,
+)
+from canvas_bulkflow_transfer import stream_to_file
+from canvas_bulkflow_watchdog import DEFAULT_STALL_SECONDS, TransferWatchdog, abort_response
+from canvas_bulkflow_workitems import STATUS_DONE, STATUS_DUPLICATE, STATUS_SKIPPED, WorkList
 
 # ========== Defaults ==========
 
@@ -14,6 +41,8 @@ DEFAULT_BASE_URL = "https://usu.instructure.com"
 DEFAULT_OUTPUT_FOLDER = r"C:\Canvas-BulkFlow\Downloads"
 DEFAULT_CANVAS_TOKEN = ""
 DEFAULT_REQUEST_TIMEOUT = 30
+DEFAULT_ROW_PAUSE = 1
+DEFAULT_FAILURES_CSV = "failed_downloads.csv"
 DELETED_AT_COLUMN = "Deleted at"
 URL_COLUMN = "Url"
 
@@ -21,11 +50,11 @@ load_env_file()
 
 # ========== Utility Functions ==========
 def sanitize_filename(name: str) -> str:
-    """
-    Removes characters not allowed on Windows file systems.
-    """
-    return re.sub(r'[\\/*?:"<>|]', "", name)
-
+    """
+    Removes characters not allowed on Windows file systems.
+    """
+    return re.sub(r'[\\/*?:"<>|]', "", name)
+
 def load_filtered_df(csv_file, file_id_column, filename_column):
     df = pd.read_csv(csv_file)
     df = df[(df['Mime type'] == 'application/pdf') & (df['Scanned:1'] == 1)]
@@ -55,6 +84,25 @@ def run_download(
     file_id_column=DEFAULT_FILE_ID_COLUMN,
     filename_column=DEFAULT_FILENAME_COLUMN,
     progress_cb=None,
+    row_pause=DEFAULT_ROW_PAUSE,
+    failures_csv=None,
+    course_id_column=DEFAULT_COURSE_ID_COLUMN,
+    bulk_metadata=True,
+    layout=DEFAULT_LAYOUT,
+    detect_text=False,
+    has_text_folder=None,
+    text_workers=DEFAULT_TEXT_WORKERS,
+    shard=None,
+    manifest_path=None,
+    write_manifest=True,
+    limiter=None,
+    watchdog=None,
+    workers=DEFAULT_WORKERS,
+    order=DEFAULT_ORDER,
+    feeder=None,
+    incremental=False,
+    snapshot_path=None,
+    profiler=None,
 ):
     token = (canvas_token or os.getenv("CANVAS_API_TOKEN", "") or DEFAULT_CANVAS_TOKEN).strip()
     if not token:
@@ -65,58 +113,101 @@ def run_download(
         "Authorization": f"Bearer {token}"
     }
 
+    # One limiter caps all downloads together; see canvas_bulkflow_bandwidth for schedules.
+    if limiter is None:
+        limiter = limiter_from_settings()
+    if limiter.active:
+        print(f"Bandwidth: {limiter.describe()}")
+
+    # Aborts downloads that outlive their size-based deadline or stop moving.
+    watchdog = watchdog or TransferWatchdog()
+
     os.makedirs(output_folder, exist_ok=True)
+    # In feeder mode files are saved to the holding folder and released into the hot folder in batches.
+    shard_folders = ShardFolders(feeder.holding_folder if feeder else output_folder)
+    if feeder:
+        print(f"Holding downloads in {feeder.holding_folder}; feeding {output_folder} at Abbyy's OCR rate.")
+    if layout != DEFAULT_LAYOUT:
+        print(f"Using '{layout}' folder layout under {output_folder}")
 
     df, duplicate_names = load_filtered_df(csv_file, file_id_column, filename_column)
+    if shard:
+        # Duplicates were found on the whole CSV, so every machine skips the same names.
+        df = df[shard_mask(df, shard, file_id_column, filename_column, duplicate_names)]
+        print(f"Shard {format_shard(shard)}: {len(df)} rows assigned to this machine.")
+
+    # Incremental mode: only rows that are new, changed or unfinished since the last report.
+    snapshot = None
+    if incremental:
+        snapshot = ReportSnapshot(snapshot_path or run_file_path(output_folder, DEFAULT_SNAPSHOT_FILENAME))
+        print(f"Report snapshot: {snapshot.path} ({len(snapshot)} files recorded)")
+        df = snapshot.select(df, file_id_column, filename_column)
+        changes_csv = os.path.join(run_files_folder(output_folder), DEFAULT_CHANGES_FILENAME)
+        df.to_csv(changes_csv, index=False)
+        print(f"Wrote the {len(df)} rows to process to {changes_csv}. Use it as the upload CSV.")
 
     total_rows = len(df)
     processed_rows = 0
 
-    # We'll keep track of:
-    # 1) files that were skipped due to duplication
-    # 2) files that were downloaded
-    skipped_duplicates = []
-    downloaded_files = []
+    # Resolve metadata per course from paginated listings where the CSV covers enough files.
+    resolver = MetadataResolver(base_url, headers, timeout=DEFAULT_REQUEST_TIMEOUT)
+    if bulk_metadata:
+        resolver.prefetch(df, file_id_column, course_id_column)
 
-    for index, row in df.iterrows():
-        processed_rows += 1
-        if progress_cb:
-            progress_cb(processed_rows, total_rows, f"Processing row {index}...")
-        file_id = row[file_id_column]
-        file_name = sanitize_filename(str(row[filename_column]))
-
-        # Skip if no file ID
-        if pd.isna(file_id):
-            print(f"[Row {index}] Missing File ID. Skipping.")
-            continue
-
-        # If this file name is in the duplicates set, skip *all* instances
-        if file_name in duplicate_names:
-            skipped_duplicates.append((file_id, file_name))
-            print(f"[Row {index}] Skipping ALL duplicates named '{file_name}' (File ID: {file_id}).")
-            continue
-
-        # 1. Fetch file metadata from Canvas API
-        file_api_url = f"{base_url}/api/v1/files/{int(file_id)}"
-        try:
-            meta_resp = requests.get(file_api_url, headers=headers, timeout=DEFAULT_REQUEST_TIMEOUT)
-        except requests.RequestException as e:
-            print(f"[Row {index}] Metadata request failed for file ID {file_id}: {e}. Skipping.")
-            continue
-        if meta_resp.status_code != 200:
-            print(f"[Row {index}] Failed to retrieve metadata for file ID {file_id} (Status: {meta_resp.status_code}). Skipping.")
-            continue
-
-        file_info = meta_resp.json()
-        download_url = file_info.get("url")
-        expected_size = file_info.get("size")
-
-        if not download_url:
-            print(f"[Row {index}] No download URL found for file ID {file_id}. Skipping.")
-            continue
-
-        # 2. Download the file
-        print(f"[Row {index}] Downloading {file_name} from {download_url}")
+    # Each row's outcome (downloaded, duplicate name, failed) is kept on its WorkItem;
+    # transient failures are retried after the main pass.
+    work_list = WorkList(df, file_id_column, filename_column, course_id_column, MANIFEST_SIZE_COLUMN)
+    retry_queue = RetryQueue()
+
+    # Upload-ready record of every saved file (see canvas_bulkflow_manifest).
+    manifest = None
+    if write_manifest:
+        manifest = DownloadManifest(manifest_path or run_file_path(output_folder, DEFAULT_MANIFEST_FILENAME))
+
+    # Optionally check each download for an existing text layer before the hot folder sees it.
+    sorter = None
+    if detect_text:
+        sorter = TextLayerSorter(
+            has_text_folder or default_has_text_folder(output_folder),
+            run_file_path(output_folder, HAS_TEXT_LIST_FILENAME),
+            workers=text_workers,
+        )
+
+    def download_row(item):
+        index = item.index
+        file_id = item.file_id
+        file_name = sanitize_filename(str(item.name))
+        limiter.wait_for_window(f" (next: row {index})")
+
+        # 1. Fetch file metadata from Canvas API (unless the course listing already had it)
+        file_info = resolver.file_info(file_id)
+        if file_info is None:
+            file_api_url = f"{base_url}/api/v1/files/{int(file_id)}"
+            try:
+                meta_resp = requests.get(file_api_url, headers=headers, timeout=DEFAULT_REQUEST_TIMEOUT)
+            except requests.RequestException as e:
+                raise_for_transient_exception(e, f"Metadata request for file ID {file_id}")
+                print(f"[Row {index}] Metadata request failed for file ID {file_id}: {e}. Skipping.")
+                retry_queue.fail(index, item, f"Metadata request failed for file ID {file_id}: {e}")
+                return False
+            if meta_resp.status_code != 200:
+                raise_for_transient_status(meta_resp, f"Metadata request for file ID {file_id}")
+                print(f"[Row {index}] Failed to retrieve metadata for file ID {file_id} (Status: {meta_resp.status_code}). Skipping.")
+                retry_queue.fail(index, item, f"Metadata status {meta_resp.status_code} for file ID {file_id}")
+                return False
+
+            file_info = meta_resp.json()
+
+        download_url = file_info.get("url")
+        expected_size = file_info.get("size")
+
+        if not download_url:
+            print(f"[Row {index}] No download URL found for file ID {file_id}. Skipping.")
+            retry_queue.fail(index, item, f"No download URL for file ID {file_id}")
+            return False
+
+        # 2. Download the file
+        print(f"[Row {index}] Downloading {file_name} from {download_url}")
         try:
             download_resp = requests.get(
                 download_url,
@@ -125,49 +216,167 @@ def run_download(
                 timeout=DEFAULT_REQUEST_TIMEOUT,
             )
         except requests.RequestException as e:
+            raise_for_transient_exception(e, f"Download of {file_name} (file ID {file_id})")
             print(f"[Row {index}] Download request failed for {file_name}: {e}.")
-            continue
+            retry_queue.fail(index, item, f"Download request failed for {file_name}: {e}")
+            return False
         if download_resp.status_code != 200:
+            try:
+                # Classify before closing: resp.text is empty once the stream is closed.
+                raise_for_transient_status(download_resp, f"Download of {file_name} (file ID {file_id})")
+            finally:
+                download_resp.close()
             print(f"[Row {index}] Failed to download {file_name} (Status: {download_resp.status_code}).")
+            retry_queue.fail(index, item, f"Download status {download_resp.status_code} for {file_name}")
+            return False
+
+        # Check the response Content-Type for debugging
+        content_type = download_resp.headers.get("Content-Type", "")
+        if "application/pdf" not in content_type.lower():
+            print(f"[Row {index}] Warning: {file_name} returned unexpected Content-Type: {content_type}")
+
+        # 3. Save the file to disk (size and digest are measured while writing)
+        course_id = item.course_id
+        filepath = os.path.join(shard_folders.ensure(shard_subdir(layout, file_id, course_id)), file_name)
+        save_path = sorter.staged_path(filepath) if sorter else filepath
+        try:
+            with watchdog.watch(
+                f"Download of {file_name} (file ID {file_id})",
+                expected_size,
+                abort=lambda: abort_response(download_resp),
+                rate_cap=limiter.current_rate or limiter.base_rate,
+            ) as watch:
+                actual_size, digest = stream_to_file(download_resp, save_path, expected_size, limiter, watch)
+        except requests.RequestException as e:
+            raise_for_transient_exception(e, f"Download of {file_name} (file ID {file_id})")
+            print(f"[Row {index}] Download of {file_name} was interrupted: {e}.")
+            retry_queue.fail(index, item, f"Download of {file_name} was interrupted: {e}")
+            return False
+
+        # 4. Verify file size
+        if expected_size and actual_size < expected_size:
+            print(f"[Row {index}] Downloaded {file_name} is smaller than expected "
+                  f"(Expected: {expected_size} bytes, Got: {actual_size} bytes).")
+        else:
+            print(f"[Row {index}] Downloaded {file_name} ({actual_size} bytes, sha256 {digest[:12]}) successfully.")
+
+        if manifest:
+            final_path = feeder.hot_path(filepath) if feeder else filepath
+            manifest.record(file_id, file_name, course_id, file_info, actual_size, digest, final_path)
+        if sorter:
+            sorter.submit(file_id, save_path, filepath)
+
+        # Optional: short pause to reduce chance of rate-limiting
+        if row_pause:
+            time.sleep(row_pause)
+        return True
+
+    progress_lock = threading.Lock()
+
+    def attempt_row(item):
+        return work_list.run(item, download_row)
+
+    def run_row(item):
+        nonlocal processed_rows
+        index = item.index
+        with progress_lock:
+            processed_rows += 1
+            if progress_cb:
+                progress_cb(processed_rows, total_rows, f"Processing row {index}...")
+        try:
+            attempt_row(item)
+        except TransientTransferError as e:
+            if retry_queue.defer(index, item, item, e):
+                print(f"[Row {index}] {e} Will retry after the main pass.")
+            else:
+                print(f"[Row {index}] {e} Not retrying.")
+
+    work = []
+    sizes = []
+    for item in work_list:
+        index = item.index
+        file_id = item.file_id
+        file_name = sanitize_filename(str(item.name))
+
+        # Skip if no file ID
+        if pd.isna(file_id):
+            print(f"[Row {index}] Missing File ID. Skipping.")
+            item.status = STATUS_SKIPPED
+            processed_rows += 1
             continue
-
-        # Check the response Content-Type for debugging
-        content_type = download_resp.headers.get("Content-Type", "")
-        if "application/pdf" not in content_type.lower():
-            print(f"[Row {index}] Warning: {file_name} returned unexpected Content-Type: {content_type}")
-
-        # 3. Save the file to disk
-        filepath = os.path.join(output_folder, file_name)
-        with open(filepath, "wb") as f:
-            for chunk in download_resp.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
-        download_resp.close()
-
-        # 4. Verify file size
-        actual_size = os.path.getsize(filepath)
-        if expected_size and actual_size < expected_size:
-            print(f"[Row {index}] Downloaded {file_name} is smaller than expected "
-                  f"(Expected: {expected_size} bytes, Got: {actual_size} bytes).")
-        else:
-            print(f"[Row {index}] Downloaded {file_name} ({actual_size} bytes) successfully.")
-
-        downloaded_files.append((file_id, file_name))
-
-        # Optional: short pause to reduce chance of rate-limiting
-        time.sleep(1)
-
-    # Final summary
+
+        # If this file name is in the duplicates set, skip *all* instances
+        if file_name in duplicate_names:
+            item.status = STATUS_DUPLICATE
+            print(f"[Row {index}] Skipping ALL duplicates named '{file_name}' (File ID: {file_id}).")
+            processed_rows += 1
+            continue
+
+        work.append(item)
+        # Expected size from the course listing, or from a manifest-style Size column.
+        size = (resolver.file_info(file_id) or {}).get("size")
+        sizes.append(size if size is not None else item.size)
+
+    # Order the work and hand it to the transfer workers (see canvas_bulkflow_scheduler).
+    if order != DEFAULT_ORDER:
+        print(f"Ordering {len(work)} downloads {order}.")
+    if feeder:
+        feeder.start()
+    runner = WorkRunner(workers, profiler)
+    try:
+        runner.run(order_work(work, sizes, order), run_row)
+    except BaseException:
+        if feeder:
+            feeder.stop()
+        raise
+
+    if len(retry_queue):
+        print(f"\n=== RETRYING {len(retry_queue)} DEFERRED FILES ===")
+        if progress_cb:
+            progress_cb(processed_rows, total_rows, f"Retrying {len(retry_queue)} deferred files...")
+        retry_queue.drain(attempt_row, label="Row")
+
+    if sorter:
+        if progress_cb:
+            progress_cb(processed_rows, total_rows, "Finishing text layer checks...")
+        sorter.close()
+    if manifest:
+        manifest.close()
+        print(f"Wrote {manifest.count} rows to the download manifest {manifest.path}.")
+    if feeder:
+        print("Download finished. Releasing the remaining held files as Abbyy catches up...")
+        feeder.finish(
+            lambda held, queued: progress_cb and progress_cb(
+                processed_rows, total_rows, f"Feeding hot folder: {held} held, {queued} queued in Abbyy..."
+            )
+        )
+
+    if snapshot is not None:
+        snapshot.save({item.file_id: item.status for item in work_list})
+
+    # Final summary
     print("\n=== DOWNLOAD SUMMARY ===")
-    print(f"Downloaded: {len(downloaded_files)} files.")
+    print(f"Downloaded: {work_list.count(STATUS_DONE)} files.")
+    skipped_duplicates = work_list.with_status(STATUS_DUPLICATE)
     if skipped_duplicates:
         print(f"Skipped {len(skipped_duplicates)} files due to name duplication:")
-        for (dup_id, dup_name) in skipped_duplicates:
-            print(f"  - File ID: {dup_id}, Name: {dup_name}")
+        for dup in skipped_duplicates:
+            print(f"  - File ID: {dup.file_id}, Name: {sanitize_filename(str(dup.name))}")
     else:
         print("No duplicates were skipped.")
-
-# ========== Script Entry Point ==========
+    work_list.print_timings()
+    if runner.workers > 1:
+        runner.print_summary()
+    if feeder:
+        feeder.print_summary()
+    watchdog.print_summary()
+    retry_queue.print_summary()
+    if retry_queue.failures:
+        failures_csv = failures_csv or os.path.join(run_files_folder(output_folder), DEFAULT_FAILURES_CSV)
+        count = retry_queue.write_failures_csv(failures_csv)
+        print(f"Wrote {count} failed rows to {failures_csv}. Use it as the CSV to rerun just those files.")
+
+# ========== Script Entry Point ==========
 def main():
     parser = argparse.ArgumentParser(description="Download scanned PDFs from Canvas based on CSV.")
     parser.add_argument("--csv", required=True, help="Path to the Ally CSV file")
@@ -176,16 +385,103 @@ def main():
     parser.add_argument("--output-folder", default=DEFAULT_OUTPUT_FOLDER)
     parser.add_argument("--file-id-column", default=DEFAULT_FILE_ID_COLUMN)
     parser.add_argument("--filename-column", default=DEFAULT_FILENAME_COLUMN)
+    parser.add_argument("--row-pause", type=float, default=DEFAULT_ROW_PAUSE,
+                        help="Seconds to wait between files (reduces rate limiting)")
+    parser.add_argument("--failures-csv", default=None,
+                        help=f"Where to write permanently failed rows (default: {DEFAULT_FAILURES_CSV} next to the output folder)")
+    parser.add_argument("--course-id-column", default=DEFAULT_COURSE_ID_COLUMN,
+                        help="CSV column used to group rows by course for bulk metadata listings")
+    parser.add_argument("--no-bulk-metadata", action="store_true",
+                        help="Always look up metadata one file at a time")
+    parser.add_argument("--layout", choices=LAYOUTS, default=DEFAULT_LAYOUT,
+                        help="Put PDFs in per-course or per-file-id subfolders instead of one flat folder")
+    parser.add_argument("--shard", type=parse_shard, default=None, metavar="I/N",
+                        help="Only handle this machine's share of the CSV, e.g. 2/4")
+    parser.add_argument("--bandwidth-limit", default=None,
+                        help="Cap on total download speed, e.g. 2MB (per second; default: CANVAS_BANDWIDTH_LIMIT)")
+    parser.add_argument("--schedule", default=None,
+                        help="Windows like 'Mon-Fri 08:00-18:00=512KB; Sat 09:00-13:00=pause' "
+                             "(default: CANVAS_TRANSFER_SCHEDULE)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="Number of files to download at the same time")
+    parser.add_argument("--order", choices=ORDERS, default=DEFAULT_ORDER,
+                        help="Work order: CSV order, largest-first (shortest total time) or smallest-first")
+    parser.add_argument("--stall-timeout", type=float, default=DEFAULT_STALL_SECONDS,
+                        help="Abort and retry a download after this many seconds without progress")
+    parser.add_argument("--min-rate", type=parse_rate, default=None,
+                        help="Slowest acceptable transfer rate, e.g. 16KB; sets each file's deadline")
+    parser.add_argument("--manifest", default=None,
+                        help=f"Download manifest path (default: {DEFAULT_MANIFEST_FILENAME} next to the output folder)")
+    parser.add_argument("--no-manifest", action="store_true", help="Don't write a download manifest")
+    parser.add_argument("--detect-text", action="store_true",
+                        help="Keep PDFs that already have a text layer out of the OCR folder")
+    parser.add_argument("--has-text-folder", default=None,
+                        help=f"Where PDFs with text go (default: {DEFAULT_HAS_TEXT_FOLDER} next to the output folder)")
+    parser.add_argument("--text-workers", type=int, default=DEFAULT_TEXT_WORKERS,
+                        help="Processes used for the text layer check")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only download rows that are new, changed or failed since the last incremental run")
+    parser.add_argument("--snapshot", default=None,
+                        help=f"Report snapshot path (default: {DEFAULT_SNAPSHOT_FILENAME} next to the output folder)")
+    parser.add_argument("--feed", action="store_true",
+                        help="Hold downloads back and release them into the hot folder at Abbyy's OCR rate")
+    parser.add_argument("--holding-folder", default=None,
+                        help="Where held downloads wait (default: Holding next to the output folder)")
+    parser.add_argument("--ocr-folder", default=None,
+                        help=f"Abbyy output folder for --feed (default: <output-folder>/{DEFAULT_OCR_FOLDER_NAME})")
+    parser.add_argument("--profile", action="store_true",
+                        help="Write CPU (cProfile) and memory (tracemalloc) reports for this run")
+    parser.add_argument("--profile-dir", default=None,
+                        help=f"Where profile reports go (default: {DEFAULT_PROFILE_FOLDER_NAME} next to the output folder)")
     args = parser.parse_args()
+    try:
+        limiter = limiter_from_settings(args.bandwidth_limit, args.schedule)
+    except ValueError as e:
+        parser.error(str(e))
+    watchdog = TransferWatchdog(stall_seconds=args.stall_timeout)
+    if args.min_rate:
+        watchdog.min_rate = args.min_rate
+    feeder = None
+    if args.feed:
+        feeder = HotFolderFeeder(
+            args.output_folder,
+            args.ocr_folder or os.path.join(args.output_folder, DEFAULT_OCR_FOLDER_NAME),
+            holding_folder=args.holding_folder,
+        )
+
+    profiler = None
+    if args.profile:
+        profile_dir = args.profile_dir or default_profile_folder(args.output_folder)
+        profiler = JobProfiler(profile_dir, "download")
 
-    run_download(
-        csv_file=args.csv,
-        canvas_token=args.token,
-        base_url=args.base_url,
-        output_folder=args.output_folder,
-        file_id_column=args.file_id_column,
-        filename_column=args.filename_column,
-    )
+    with profiler or contextlib.nullcontext():
+        run_download(
+            csv_file=args.csv,
+            canvas_token=args.token,
+            base_url=args.base_url,
+            output_folder=args.output_folder,
+            file_id_column=args.file_id_column,
+            filename_column=args.filename_column,
+            row_pause=args.row_pause,
+            failures_csv=args.failures_csv,
+            course_id_column=args.course_id_column,
+            bulk_metadata=not args.no_bulk_metadata,
+            layout=args.layout,
+            detect_text=args.detect_text,
+            has_text_folder=args.has_text_folder,
+            text_workers=args.text_workers,
+            shard=args.shard,
+            manifest_path=args.manifest,
+            write_manifest=not args.no_manifest,
+            limiter=limiter,
+            watchdog=watchdog,
+            workers=args.workers,
+            order=args.order,
+            feeder=feeder,
+            incremental=args.incremental,
+            snapshot_path=args.snapshot,
+            profiler=profiler,
+        )
 
 
 if __name__ == "__main__":
@@ -1,136 +1,209 @@
 import os
+import threading
 import time
 import requests
 import pandas as pd
 import argparse
+import contextlib
+from canvas_bulkflow_bandwidth import limiter_from_settings, parse_rate
 from canvas_bulkflow_config import load_env_file
-
-# -------------------------------------------------------------------------------
-# Configuration
-# -------------------------------------------------------------------------------
-
+from canvas_bulkflow_layout import DEFAULT_LAYOUT, LAYOUTS, run_file_path, shard_subdir
+from canvas_bulkflow_ledger import DEFAULT_LEDGER_FILENAME, UploadLedger
+from canvas_bulkflow_manifest import DEFAULT_MANIFEST_FILENAME, apply_manifest
+from canvas_bulkflow_metadata import (
+    DEFAULT_COURSE_ID_COLUMN,
+    DEFAULT_DISPLAY_NAME_COLUMN,
+    DEFAULT_FOLDER_ID_COLUMN,
+    MetadataResolver,
+    complete_context_mask,
+    row_context,
+)
+from canvas_bulkflow_ocr_index import OcrFolderIndex
+from canvas_bulkflow_profiler import DEFAULT_PROFILE_FOLDER_NAME, JobProfiler, default_profile_folder
+from canvas_bulkflow_retry import (
+    RetryQueue,
+    TransientTransferError,
+    raise_for_transient_exception,
+    raise_for_transient_status,
+)
+from canvas_bulkflow_scheduler import DEFAULT_ORDER, DEFAULT_WORKERS, ORDERS, WorkRunner, order_work
+from canvas_bulkflow_shard import format_shard, parse_shard, shard_mask
+from canvas_bulkflow_textlayer import HAS_TEXT_LIST_FILENAME, read_has_text_list
+from canvas_bulkflow_transfer import MultipartUploadBody
+from canvas_bulkflow_watchdog import DEFAULT_STALL_SECONDS, TransferWatchdog
+from canvas_bulkflow_workitems import STATUS_HAS_TEXT, STATUS_SKIPPED, WorkList
+
+# -------------------------------------------------------------------------------
+# Configuration
+# -------------------------------------------------------------------------------
+
 DEFAULT_BASE_URL = "https://usu.instructure.com"
 DEFAULT_OCR_FOLDER = r"C:\Canvas-BulkFlow\Downloads\OCRed"
 DEFAULT_CANVAS_TOKEN = ""
 DEFAULT_REQUEST_TIMEOUT = 30
+DEFAULT_ROW_PAUSE = 1
+DEFAULT_FAILURES_CSV = "failed_uploads.csv"
 
 load_env_file()
 
 # -------------------------------------------------------------------------------
 # Helper Functions
-# -------------------------------------------------------------------------------
-
+#
+# Timeouts, connection errors, 5xx and throttled responses raise
+# TransientTransferError so the caller can retry them later; other failures are
+# printed and reported through the return value.
+# -------------------------------------------------------------------------------
+
 def get_file_metadata(file_id, headers, base_url):
     url = f"{base_url}/api/v1/files/{file_id}"
     try:
         resp = requests.get(url, headers=headers, timeout=DEFAULT_REQUEST_TIMEOUT)
     except requests.RequestException as e:
+        raise_for_transient_exception(e, f"[get_file_metadata] Request for file_id={file_id}")
         print(f"[get_file_metadata] Request failed for file_id={file_id}: {e}")
         return None
     if resp.status_code == 200:
         return resp.json()
-    else:
-        print(f"[get_file_metadata] Failed for file_id={file_id}. Status {resp.status_code}: {resp.text}")
-        return None
-
+    else:
+        raise_for_transient_status(resp, f"[get_file_metadata] Request for file_id={file_id}")
+        print(f"[get_file_metadata] Failed for file_id={file_id}. Status {resp.status_code}: {resp.text}")
+        return None
+
 def get_folder_metadata(folder_id, headers, base_url):
     url = f"{base_url}/api/v1/folders/{folder_id}"
     try:
         resp = requests.get(url, headers=headers, timeout=DEFAULT_REQUEST_TIMEOUT)
     except requests.RequestException as e:
+        raise_for_transient_exception(e, f"[get_folder_metadata] Request for folder_id={folder_id}")
         print(f"[get_folder_metadata] Request failed for folder_id={folder_id}: {e}")
         return None
     if resp.status_code == 200:
         return resp.json()
-    else:
-        print(f"[get_folder_metadata] Failed for folder_id={folder_id}. Status {resp.status_code}: {resp.text}")
-        return None
-
-def overwrite_file_in_canvas(course_id, folder_id, local_file_path, filename, headers, base_url):
-    if not os.path.exists(local_file_path):
-        print(f"[overwrite_file_in_canvas] Local file not found: {local_file_path}")
-        return False
-
-    file_size = os.path.getsize(local_file_path)
-    content_type = 'application/pdf'
-
-    # 1) Initiate the upload
+    else:
+        raise_for_transient_status(resp, f"[get_folder_metadata] Request for folder_id={folder_id}")
+        print(f"[get_folder_metadata] Failed for folder_id={folder_id}. Status {resp.status_code}: {resp.text}")
+        return None
+
+def _canvas_file_from_response(resp):
+    # The confirmation body is the Canvas file object; keep it non-empty so callers can test truthiness.
+    try:
+        body = resp.json()
+    except ValueError:
+        body = None
+    return body if isinstance(body, dict) and body else {"id": None}
+
+def _same_id(a, b):
+    try:
+        return int(float(a)) == int(float(b))
+    except (TypeError, ValueError):
+        return str(a) == str(b)
+
+def _replaced_target(canvas_file, file_id, folder_id):
+    """
+    False when the confirmed upload names a different file or folder than the one we meant to
+    overwrite, e.g. a stale display name from the CSV made Canvas create a new file instead.
+    """
+    returned_id, returned_folder = canvas_file.get("id"), canvas_file.get("folder_id")
+    if returned_id is not None and not _same_id(returned_id, file_id):
+        return False
+    return returned_folder is None or folder_id is None or _same_id(returned_folder, folder_id)
+
+def overwrite_file_in_canvas(
+    course_id, folder_id, local_file_path, filename, headers, base_url, limiter=None, watchdog=None
+):
+    # Returns the updated Canvas file object (a non-empty dict) on success, False otherwise.
+    if not os.path.exists(local_file_path):
+        print(f"[overwrite_file_in_canvas] Local file not found: {local_file_path}")
+        return False
+
+    file_size = os.path.getsize(local_file_path)
+    content_type = 'application/pdf'
+
+    # 1) Initiate the upload
     initiate_url = f"{base_url}/api/v1/courses/{course_id}/files"
-    payload = {
-        'name': filename,
-        'parent_folder_id': folder_id,
-        'on_duplicate': 'overwrite',
-        'size': file_size,
-        'content_type': content_type
-    }
-
-    print(f"[Initiate] POST {initiate_url} with payload={payload}")
+    payload = {
+        'name': filename,
+        'parent_folder_id': folder_id,
+        'on_duplicate': 'overwrite',
+        'size': file_size,
+        'content_type': content_type
+    }
+
+    print(f"[Initiate] POST {initiate_url} with payload={payload}")
     try:
         init_resp = requests.post(
             initiate_url, headers=headers, data=payload, timeout=DEFAULT_REQUEST_TIMEOUT
         )
     except requests.RequestException as e:
+        raise_for_transient_exception(e, f"[Initiate] Upload initiation for '{filename}'")
         print(f"[Initiate] Request failed: {e}")
         return False
-    print("[Initiate] Status:", init_resp.status_code)
-    print("[Initiate] Body:", init_resp.text)
-
-    if init_resp.status_code not in (200, 201):
-        print(f"Failed to initiate upload for '{filename}'.")
-        return False
-
-    upload_info = init_resp.json()
-    upload_url = upload_info.get('upload_url')
-    upload_params = upload_info.get('upload_params')
-    if not upload_url or not upload_params:
-        print("[Initiate] Missing 'upload_url' or 'upload_params' in initiation response.")
-        return False
-
-    # 2) Perform the actual file upload
-    with open(local_file_path, 'rb') as f:
-        files_data = {
-            'file': (filename, f, content_type)
-        }
+    print("[Initiate] Status:", init_resp.status_code)
+    print("[Initiate] Body:", init_resp.text)
+
+    if init_resp.status_code not in (200, 201):
+        raise_for_transient_status(init_resp, f"[Initiate] Upload initiation for '{filename}'")
+        print(f"Failed to initiate upload for '{filename}'.")
+        return False
+
+    upload_info = init_resp.json()
+    upload_url = upload_info.get('upload_url')
+    upload_params = upload_info.get('upload_params')
+    if not upload_url or not upload_params:
+        print("[Initiate] Missing 'upload_url' or 'upload_params' in initiation response.")
+        return False
+
+    # 2) Perform the actual file upload (streamed from disk, within the bandwidth limit)
+    watchdog = watchdog or TransferWatchdog()
+    rate_cap = (limiter.current_rate or limiter.base_rate) if limiter else None
+    upload_watch = watchdog.watch(f"Upload of '{filename}'", file_size, rate_cap=rate_cap)
+    with open(local_file_path, 'rb') as f, upload_watch as watch:
+        body = MultipartUploadBody(upload_params, 'file', filename, f, file_size, content_type, limiter, watch)
         try:
             upload_resp = requests.post(
-                upload_url, data=upload_params, files=files_data, timeout=DEFAULT_REQUEST_TIMEOUT
+                upload_url, data=body, headers={'Content-Type': body.content_type},
+                timeout=DEFAULT_REQUEST_TIMEOUT,
             )
         except requests.RequestException as e:
+            raise_for_transient_exception(e, f"[Upload] Upload of '{filename}'")
             print(f"[Upload] Request failed: {e}")
             return False
-
-    print("[Upload] Status:", upload_resp.status_code)
-    print("[Upload] Body:", upload_resp.text)
-
-    if upload_resp.status_code in [200, 201]:
-        print(f"Successfully replaced file with '{filename}' (status={upload_resp.status_code}).")
-        return True
-    elif upload_resp.status_code == 302:
-        # Handle possible redirect
-        redirect_url = upload_resp.headers.get('Location')
-        if redirect_url:
+
+    print("[Upload] Status:", upload_resp.status_code)
+    print("[Upload] Body:", upload_resp.text)
+
+    if upload_resp.status_code in [200, 201]:
+        print(f"Successfully replaced file with '{filename}' (status={upload_resp.status_code}).")
+        return _canvas_file_from_response(upload_resp)
+    elif upload_resp.status_code == 302:
+        # Handle possible redirect
+        redirect_url = upload_resp.headers.get('Location')
+        if redirect_url:
             try:
                 final_resp = requests.get(
                     redirect_url, headers=headers, timeout=DEFAULT_REQUEST_TIMEOUT
                 )
             except requests.RequestException as e:
+                raise_for_transient_exception(e, f"[Redirect] Upload confirmation for '{filename}'")
                 print(f"[Redirect] Request failed: {e}")
                 return False
-            print("[Redirect] Status:", final_resp.status_code)
-            print("[Redirect] Body:", final_resp.text)
-            if final_resp.status_code in [200, 201]:
-                print(f"Successfully replaced file with '{filename}' (after redirect).")
-                return True
-        print("Redirect failed or missing location header.")
-        return False
-    else:
-        print(f"File upload step failed. Status {upload_resp.status_code}")
-        return False
-
-# -------------------------------------------------------------------------------
-# Bulk Replacement Function with Logging
-# -------------------------------------------------------------------------------
-
+            print("[Redirect] Status:", final_resp.status_code)
+            print("[Redirect] Body:", final_resp.text)
+            if final_resp.status_code in [200, 201]:
+                print(f"Successfully replaced file with '{filename}' (after redirect).")
+                return _canvas_file_from_response(final_resp)
+            raise_for_transient_status(final_resp, f"[Redirect] Upload confirmation for '{filename}'")
+        print("Redirect failed or missing location header.")
+        return False
+    else:
+        raise_for_transient_status(upload_resp, f"[Upload] Upload of '{filename}'")
+        print(f"File upload step failed. Status {upload_resp.status_code}")
+        return False
+
+# -------------------------------------------------------------------------------
+# Bulk Replacement Function with Logging
+# -------------------------------------------------------------------------------
+
 def bulk_replace_ocr_files(
     csv_file,
     canvas_token,
@@ -139,14 +212,67 @@ def bulk_replace_ocr_files(
     file_id_col="File_ID",
     ocr_path_col="OCR_File_Path",
     progress_cb=None,
+    row_pause=DEFAULT_ROW_PAUSE,
+    failures_csv=None,
+    ledger_path=None,
+    use_ledger=True,
+    verify_ledger=False,
+    course_id_column=DEFAULT_COURSE_ID_COLUMN,
+    bulk_metadata=True,
+    folder_id_column=DEFAULT_FOLDER_ID_COLUMN,
+    display_name_column=DEFAULT_DISPLAY_NAME_COLUMN,
+    layout=DEFAULT_LAYOUT,
+    ocr_index=None,
+    has_text_list=None,
+    shard=None,
+    manifest_path=None,
+    use_manifest=True,
+    limiter=None,
+    watchdog=None,
+    workers=DEFAULT_WORKERS,
+    order=DEFAULT_ORDER,
+    profiler=None,
 ):
-    """
-    Reads a CSV file containing:
-      - A column with Canvas File IDs (file_id_col)
-      - A column with the OCRed PDF's filename (ocr_path_col); the file is located in the fixed 'ocr_folder'
-    
-    Then overwrites each file in Canvas with the OCRed version and prints a summary log.
-    """
+    """
+    Reads a CSV file containing:
+      - A column with Canvas File IDs (file_id_col)
+      - A column with the OCRed PDF's filename (ocr_path_col); the file is located in the fixed 'ocr_folder'
+    
+    Then overwrites each file in Canvas with the OCRed version and prints a summary log.
+
+    Successful replacements are recorded in an upload ledger (default: 'ocr_folder'/upload_ledger.jsonl).
+    On reruns, files whose local content was already uploaded are skipped. With verify_ledger,
+    those files are only skipped if Canvas still reports the size and updated_at we recorded.
+
+    When the CSV carries context columns (course_id_column, folder_id_column, display_name_column),
+    rows that have them go straight to the upload. Rows with only a course id skip the folder lookup.
+
+    With a sharded layout (see canvas_bulkflow_layout), each row's OCRed file is looked up in
+    the same subfolder run_download used for it, falling back to the top of 'ocr_folder'.
+
+    The OCR folder is indexed once up front (see canvas_bulkflow_ocr_index), which also matches
+    Abbyy output names that differ by case or an added suffix, but never an output named after
+    another row. Pass an existing OcrFolderIndex as ocr_index to reuse it; it is refreshed
+    instead of rebuilt.
+
+    Rows listed in the download step's has-text list (default: has_text_layer.csv next to
+    'ocr_folder') already had a text layer and were never OCRed, so they are skipped.
+
+    With shard=(i, n), only the rows run_download assigned to shard i are processed
+    (see canvas_bulkflow_shard).
+
+    The download manifest (default: download_manifest.csv next to 'ocr_folder') fills in the
+    context columns for rows it covers, so those rows skip the metadata lookups. The manifest
+    can also be passed as csv_file itself.
+
+    Uploads share one BandwidthLimiter (limiter; default: from CANVAS_BANDWIDTH_LIMIT and
+    CANVAS_TRANSFER_SCHEDULE). During a "pause" window the job waits before the next file.
+    A TransferWatchdog (watchdog) aborts uploads that stall and requeues them for retry.
+
+    workers sets how many files upload at once; order (see canvas_bulkflow_scheduler) can run
+    the largest or smallest OCRed files first instead of following the CSV. A JobProfiler
+    (profiler) entered around the call also profiles the transfer threads.
+    """
     token = (canvas_token or os.getenv("CANVAS_API_TOKEN", "") or DEFAULT_CANVAS_TOKEN).strip()
     if not token:
         print("Canvas API token is required. Set CANVAS_API_TOKEN or provide it in the UI.")
@@ -156,80 +282,291 @@ def bulk_replace_ocr_files(
         "Authorization": f"Bearer {token}"
     }
 
+    if limiter is None:
+        limiter = limiter_from_settings()
+    if limiter.active:
+        print(f"Bandwidth: {limiter.describe()}")
+    watchdog = watchdog or TransferWatchdog()
+
     df = pd.read_csv(csv_file)
-    total_rows = len(df)
-    success_count = 0
-    failure_count = 0
-    skipped_count = 0
-
+    # Every row's name, including other shards' rows, which may share the OCR folder.
+    csv_names = set(df[ocr_path_col].dropna().astype(str)) if ocr_path_col in df.columns else set()
+    if shard:
+        df = df[shard_mask(df, shard, file_id_col)]
+        print(f"Shard {format_shard(shard)}: {len(df)} rows assigned to this machine.")
+    if use_manifest:
+        # The OCRed folder sits in the download folder; the manifest is written next to that.
+        manifest_path = manifest_path or run_file_path(
+            os.path.dirname(os.path.abspath(ocr_folder)), DEFAULT_MANIFEST_FILENAME
+        )
+        if os.path.exists(manifest_path):
+            df, matched = apply_manifest(
+                df, manifest_path, file_id_col, course_id_column, folder_id_column, display_name_column
+            )
+            print(f"Download manifest: {manifest_path} (covers {matched} of {len(df)} rows)")
+    total_rows = len(df)
+    success_count = 0
+    failure_count = 0
+    skipped_count = 0
+    already_replaced_count = 0
+    has_text_count = 0
+
+    ledger = None
+    if use_ledger:
+        ledger = UploadLedger(ledger_path or os.path.join(ocr_folder, DEFAULT_LEDGER_FILENAME), base_url)
+        print(f"Upload ledger: {ledger.path} ({len(ledger)} files recorded)")
+
     total_rows = len(df)
     processed_rows = 0
+    retry_queue = RetryQueue()
+    # Counters are updated from the transfer threads when workers > 1.
+    counts_lock = threading.Lock()
+
+    if ocr_index is None:
+        ocr_index = OcrFolderIndex(ocr_folder, csv_names)
+    else:
+        ocr_index.csv_names = csv_names
+        ocr_index.refresh()
+    print(f"OCR folder index: {len(ocr_index)} PDFs in {ocr_folder}")
+
+    has_text_list = has_text_list or run_file_path(os.path.dirname(os.path.abspath(ocr_folder)), HAS_TEXT_LIST_FILENAME)
+    has_text_ids, has_text_names = read_has_text_list(has_text_list)
+    if has_text_ids or has_text_names:
+        print(f"Has-text list: {has_text_list}")
+
+    # Resolve file and folder metadata per course from paginated listings where possible.
+    resolver = MetadataResolver(base_url, headers, timeout=DEFAULT_REQUEST_TIMEOUT)
+    if bulk_metadata:
+        # Rows with full CSV context don't need the API at all.
+        needs_lookup = ~complete_context_mask(df, course_id_column, folder_id_column, display_name_column)
+        resolver.prefetch(df[needs_lookup], file_id_col, course_id_column, include_folders=True)
+
+    work_list = WorkList(df, file_id_col, ocr_path_col, course_id_column)
+
+    def replace_row(item, use_csv_context=True):
+        nonlocal success_count, failure_count, skipped_count, already_replaced_count
+        idx, local_file_path, digest = item.index, item.path, item.digest
+        file_id = item.file_id
+        if use_csv_context:
+            limiter.wait_for_window(f" (next: row {idx})")
+
+        # Context columns from the CSV, when present, save the file and folder lookups below.
+        course_id, folder_id, old_filename = None, None, None
+        if use_csv_context:
+            course_id, folder_id, old_filename = row_context(
+                item, course_id_column, folder_id_column, display_name_column
+            )
+        used_csv_context = course_id is not None or folder_id is not None
+        needs_file_info = folder_id is None or old_filename is None
+        ledger_hit = ledger is not None and verify_ledger and ledger.is_replaced(file_id, digest)
+        # Folder and name taken from the CSV unchecked; the upload result is checked against them below.
+        trusted_csv_file_info = not needs_file_info and not ledger_hit
+
+        # (A) Get file metadata
+        if needs_file_info or ledger_hit:
+            file_info = resolver.file_info(file_id) or get_file_metadata(file_id, headers, base_url)
+            if file_info and ledger_hit:
+                if ledger.matches_canvas(file_id, file_info):
+                    print(f"[Row {idx}] Already replaced file_id={file_id} (verified against Canvas). Skipping.")
+                    with counts_lock:
+                        already_replaced_count += 1
+                    return True
+                print(f"[Row {idx}] Canvas no longer matches the ledger for file_id={file_id}. Re-uploading.")
+            if not file_info:
+                print(f"[Row {idx}] Failed to get metadata for file_id={file_id}. Skipping.")
+                retry_queue.fail(idx, item, f"Failed to get metadata for file_id={file_id}")
+                with counts_lock:
+                    skipped_count += 1
+                return False
+
+            folder_id = file_info.get('folder_id')
+            old_filename = file_info.get('display_name')
+
+        if course_id is not None and resolver.folder_outside_course(folder_id, course_id):
+            print(f"[Row {idx}] Folder {folder_id} is not in course {course_id} from the CSV. Looking it up.")
+            course_id = None
+
+        # (B) Get folder metadata to determine course_id
+        if course_id is None:
+            folder_info = resolver.folder_info(folder_id)
+            if folder_info is None:
+                folder_info = get_folder_metadata(folder_id, headers, base_url)
+                # Many rows share a folder; look each one up only once.
+                resolver.remember_folder(folder_info)
+            if not folder_info:
+                print(f"[Row {idx}] Failed to get folder info for folder_id={folder_id}. Skipping.")
+                retry_queue.fail(idx, item, f"Failed to get folder info for folder_id={folder_id} (file_id={file_id})")
+                with counts_lock:
+                    skipped_count += 1
+                return False
+
+            course_id = folder_info.get('context_id')
+            context_type = folder_info.get('context_type')
+            if str(context_type).lower() != 'course':
+                print(f"[Row {idx}] Not a course folder (context_type={context_type}). Skipping.")
+                with counts_lock:
+                    skipped_count += 1
+                return False
+
+        # (C) Overwrite the file in Canvas
+        print(f"[Row {idx}] Overwriting file_id={file_id} with local file: {local_file_path}")
+        success = overwrite_file_in_canvas(
+            course_id, folder_id, local_file_path, old_filename, headers, base_url, limiter, watchdog
+        )
+        if success and trusted_csv_file_info and not _replaced_target(success, file_id, folder_id):
+            print(
+                f"[Row {idx}] Canvas stored the upload as file_id={success.get('id')} in "
+                f"folder_id={success.get('folder_id')}, not file_id={file_id} in folder_id={folder_id}; "
+                f"the CSV's folder or display name is stale. Retrying with Canvas lookups."
+            )
+            return replace_row(item, use_csv_context=False)
+        if success:
+            print(f"[Row {idx}] Successfully replaced file_id={file_id}.")
+            with counts_lock:
+                success_count += 1
+            if ledger is not None:
+                ledger.record(file_id, digest, local_file_path, success)
+        elif used_csv_context:
+            print(f"[Row {idx}] Upload using the CSV's course/folder failed. Retrying with Canvas lookups.")
+            return replace_row(item, use_csv_context=False)
+        else:
+            print(f"[Row {idx}] Failed to replace file_id={file_id}.")
+            retry_queue.fail(idx, item, f"Failed to replace file_id={file_id}")
+            with counts_lock:
+                failure_count += 1
+
+        # Optional: Pause to avoid rate-limiting
+        if row_pause:
+            time.sleep(row_pause)
+        return success
+
+    def attempt_row(item):
+        return work_list.run(item, replace_row)
+
+    def run_row(item):
+        nonlocal processed_rows, skipped_count, already_replaced_count
+        idx, local_file_path = item.index, item.path
+        file_id = item.file_id
+        with counts_lock:
+            processed_rows += 1
+            if progress_cb:
+                progress_cb(processed_rows, total_rows, f"Processing row {idx}...")
+
+        digest = None
+        if ledger is not None:
+            try:
+                digest = ledger.local_digest(file_id, local_file_path)
+            except OSError as e:
+                # Removed or renamed since the folder was indexed.
+                print(f"[Row {idx}] Could not read {local_file_path}: {e}. Skipping.")
+                item.status = STATUS_SKIPPED
+                with counts_lock:
+                    skipped_count += 1
+                return
+            if not verify_ledger and ledger.is_replaced(file_id, digest):
+                print(f"[Row {idx}] Already replaced file_id={file_id} with identical content (ledger). Skipping.")
+                item.status = STATUS_SKIPPED
+                with counts_lock:
+                    already_replaced_count += 1
+                return
+
+        item.digest = digest
+        try:
+            attempt_row(item)
+        except TransientTransferError as e:
+            if retry_queue.defer(idx, item, item, e):
+                print(f"[Row {idx}] {e} Will retry after the main pass.")
+            else:
+                print(f"[Row {idx}] {e} Not retrying.")
+
+    work = []
+    sizes = []
+    for item in work_list:
+        idx = item.index
+        file_id = item.file_id
+        file_name_from_csv = item.name
+
+        if not file_id or pd.isna(file_id):
+            print(f"[Row {idx}] Missing file_id. Skipping.")
+            item.status = STATUS_SKIPPED
+            skipped_count += 1
+            processed_rows += 1
+            continue
+        try:
+            numeric_id = int(float(file_id))
+        except (TypeError, ValueError):
+            print(f"[Row {idx}] Invalid file_id {file_id!r}. Skipping.")
+            item.status = STATUS_SKIPPED
+            skipped_count += 1
+            processed_rows += 1
+            continue
+        if numeric_id in has_text_ids or file_name_from_csv in has_text_names:
+            print(f"[Row {idx}] file_id={file_id} already had a text layer and wasn't OCRed. Skipping.")
+            item.status = STATUS_HAS_TEXT
+            has_text_count += 1
+            processed_rows += 1
+            continue
+        # Look in the row's shard first (if any), then at the top of the OCR folder.
+        subdir = ""
+        if layout != DEFAULT_LAYOUT:
+            subdir = shard_subdir(layout, file_id, item.course_id)
+        local_file_path = ocr_index.resolve(file_name_from_csv, subdir)
+        if not local_file_path:
+            print(f"[Row {idx}] No OCRed file found for '{file_name_from_csv}' in {ocr_folder}. Skipping.")
+            item.status = STATUS_SKIPPED
+            skipped_count += 1
+            processed_rows += 1
+            continue
+        if os.path.basename(local_file_path) != file_name_from_csv:
+            print(f"[Row {idx}] Matched '{file_name_from_csv}' to OCR output {os.path.basename(local_file_path)}.")
+
+        item.path = local_file_path
+        work.append(item)
+        if order != DEFAULT_ORDER:
+            try:
+                item.size = os.path.getsize(local_file_path)
+            except OSError:
+                pass
+            sizes.append(item.size)
 
-    for idx, row in df.iterrows():
-        processed_rows += 1
+    # Order the work and hand it to the transfer workers (see canvas_bulkflow_scheduler).
+    if order != DEFAULT_ORDER:
+        print(f"Ordering {len(work)} uploads {order}.")
+    runner = WorkRunner(workers, profiler)
+    runner.run(order_work(work, sizes, order), run_row)
+
+    if len(retry_queue):
+        print(f"\n=== RETRYING {len(retry_queue)} DEFERRED FILES ===")
         if progress_cb:
-            progress_cb(processed_rows, total_rows, f"Processing row {idx}...")
-        file_id = row.get(file_id_col)
-        file_name_from_csv = row.get(ocr_path_col)
-        # Build full local file path by joining the OCR folder with the filename from the CSV
-        local_file_path = os.path.join(ocr_folder, file_name_from_csv) if pd.notna(file_name_from_csv) else None
-
-        if not file_id or pd.isna(file_id):
-            print(f"[Row {idx}] Missing file_id. Skipping.")
-            skipped_count += 1
-            continue
-        if not local_file_path or not os.path.exists(local_file_path):
-            print(f"[Row {idx}] Local file path missing or invalid: {local_file_path}. Skipping.")
-            skipped_count += 1
-            continue
-
-        # (A) Get file metadata
-        file_info = get_file_metadata(file_id, headers, base_url)
-        if not file_info:
-            print(f"[Row {idx}] Failed to get metadata for file_id={file_id}. Skipping.")
-            skipped_count += 1
-            continue
-
-        folder_id = file_info.get('folder_id')
-        old_filename = file_info.get('display_name')
-
-        # (B) Get folder metadata to determine course_id
-        folder_info = get_folder_metadata(folder_id, headers, base_url)
-        if not folder_info:
-            print(f"[Row {idx}] Failed to get folder info for folder_id={folder_id}. Skipping.")
-            skipped_count += 1
-            continue
-
-        course_id = folder_info.get('context_id')
-        context_type = folder_info.get('context_type')
-        if str(context_type).lower() != 'course':
-            print(f"[Row {idx}] Not a course folder (context_type={context_type}). Skipping.")
-            skipped_count += 1
-            continue
-
-        # (C) Overwrite the file in Canvas
-        print(f"[Row {idx}] Overwriting file_id={file_id} with local file: {local_file_path}")
-        success = overwrite_file_in_canvas(course_id, folder_id, local_file_path, old_filename, headers, base_url)
-        if success:
-            print(f"[Row {idx}] Successfully replaced file_id={file_id}.")
-            success_count += 1
-        else:
-            print(f"[Row {idx}] Failed to replace file_id={file_id}.")
-            failure_count += 1
-
-        # Optional: Pause to avoid rate-limiting
-        time.sleep(1)
-
-    # Final summary log
-    print("\n=== UPLOAD SUMMARY ===")
-    print(f"Total rows in CSV: {total_rows}")
-    print(f"Files successfully replaced: {success_count}")
-    print(f"Files failed to replace: {failure_count}")
-    print(f"Files skipped: {skipped_count}")
-
-# -------------------------------------------------------------------------------
-# Main / Example
-# -------------------------------------------------------------------------------
+            progress_cb(processed_rows, total_rows, f"Retrying {len(retry_queue)} deferred files...")
+        retry_queue.drain(attempt_row, label="Row")
+    failure_count += retry_queue.exhausted
+
+    # Final summary log
+    print("\n=== UPLOAD SUMMARY ===")
+    print(f"Total rows in CSV: {total_rows}")
+    print(f"Files successfully replaced: {success_count}")
+    print(f"Files failed to replace: {failure_count}")
+    print(f"Files skipped: {skipped_count}")
+    if ledger is not None:
+        print(f"Files already replaced (ledger): {already_replaced_count}")
+    if has_text_count:
+        print(f"Files skipped because they already had text: {has_text_count}")
+    if ocr_index.variant_matches:
+        print(f"Files matched by a variant of the CSV name: {ocr_index.variant_matches}")
+    work_list.print_timings()
+    if runner.workers > 1:
+        runner.print_summary()
+    watchdog.print_summary()
+    retry_queue.print_summary()
+    if retry_queue.failures:
+        failures_csv = failures_csv or os.path.join(ocr_folder, DEFAULT_FAILURES_CSV)
+        count = retry_queue.write_failures_csv(failures_csv)
+        print(f"Wrote {count} failed rows to {failures_csv}. Use it as the CSV to rerun just those files.")
+
+# -------------------------------------------------------------------------------
+# Main / Example
+# -------------------------------------------------------------------------------
 def main():
     parser = argparse.ArgumentParser(description="Replace Canvas files with OCRed versions based on CSV.")
     parser.add_argument("--csv", required=True, help="Path to the CSV file")
@@ -238,16 +575,94 @@ def main():
     parser.add_argument("--ocr-folder", default=DEFAULT_OCR_FOLDER)
     parser.add_argument("--file-id-column", default="Id")
     parser.add_argument("--filename-column", default="Name")
+    parser.add_argument("--row-pause", type=float, default=DEFAULT_ROW_PAUSE,
+                        help="Seconds to wait between files (reduces rate limiting)")
+    parser.add_argument("--failures-csv", default=None,
+                        help=f"Where to write permanently failed rows (default: <ocr-folder>/{DEFAULT_FAILURES_CSV})")
+    parser.add_argument("--ledger", default=None,
+                        help=f"Upload ledger path (default: <ocr-folder>/{DEFAULT_LEDGER_FILENAME})")
+    parser.add_argument("--no-ledger", action="store_true", help="Upload every file, ignoring the ledger")
+    parser.add_argument("--verify-ledger", action="store_true",
+                        help="Only skip ledger entries that still match live Canvas size and updated_at")
+    parser.add_argument("--course-id-column", default=DEFAULT_COURSE_ID_COLUMN,
+                        help="CSV column used to group rows by course for bulk metadata listings")
+    parser.add_argument("--no-bulk-metadata", action="store_true",
+                        help="Always look up metadata one file at a time")
+    parser.add_argument("--folder-id-column", default=DEFAULT_FOLDER_ID_COLUMN,
+                        help="Optional CSV column with the Canvas folder id")
+    parser.add_argument("--display-name-column", default=DEFAULT_DISPLAY_NAME_COLUMN,
+                        help="Optional CSV column with the Canvas display name")
+    parser.add_argument("--layout", choices=LAYOUTS, default=DEFAULT_LAYOUT,
+                        help="Folder layout used by the download step")
+    parser.add_argument("--shard", type=parse_shard, default=None, metavar="I/N",
+                        help="Only handle this machine's share of the CSV (same value as the download)")
+    parser.add_argument("--bandwidth-limit", default=None,
+                        help="Cap on total upload speed, e.g. 2MB (per second; default: CANVAS_BANDWIDTH_LIMIT)")
+    parser.add_argument("--schedule", default=None,
+                        help="Windows like 'Mon-Fri 08:00-18:00=512KB; Sat 09:00-13:00=pause' "
+                             "(default: CANVAS_TRANSFER_SCHEDULE)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="Number of files to upload at the same time")
+    parser.add_argument("--order", choices=ORDERS, default=DEFAULT_ORDER,
+                        help="Work order: CSV order, largest-first (shortest total time) or smallest-first")
+    parser.add_argument("--stall-timeout", type=float, default=DEFAULT_STALL_SECONDS,
+                        help="Abort and retry an upload after this many seconds without progress")
+    parser.add_argument("--min-rate", type=parse_rate, default=None,
+                        help="Slowest acceptable transfer rate, e.g. 16KB; sets each file's deadline")
+    parser.add_argument("--manifest", default=None,
+                        help=f"Download manifest (default: {DEFAULT_MANIFEST_FILENAME} next to the download folder "
+                             "that holds the OCR folder)")
+    parser.add_argument("--no-manifest", action="store_true", help="Ignore the download manifest")
+    parser.add_argument("--has-text-list", default=None,
+                        help=f"Has-text list written by the download step (default: {HAS_TEXT_LIST_FILENAME} "
+                             "next to the download folder that holds the OCR folder)")
+    parser.add_argument("--profile", action="store_true",
+                        help="Write CPU (cProfile) and memory (tracemalloc) reports for this run")
+    parser.add_argument("--profile-dir", default=None,
+                        help=f"Where profile reports go (default: {DEFAULT_PROFILE_FOLDER_NAME} next to the download "
+                             "folder that holds the OCR folder)")
     args = parser.parse_args()
+    try:
+        limiter = limiter_from_settings(args.bandwidth_limit, args.schedule)
+    except ValueError as e:
+        parser.error(str(e))
+    watchdog = TransferWatchdog(stall_seconds=args.stall_timeout)
+    if args.min_rate:
+        watchdog.min_rate = args.min_rate
 
-    bulk_replace_ocr_files(
-        csv_file=args.csv,
-        canvas_token=args.token,
-        base_url=args.base_url,
-        ocr_folder=args.ocr_folder,
-        file_id_col=args.file_id_column,
-        ocr_path_col=args.filename_column,
-    )
+    profiler = None
+    if args.profile:
+        profile_dir = args.profile_dir or default_profile_folder(os.path.dirname(os.path.abspath(args.ocr_folder)))
+        profiler = JobProfiler(profile_dir, "upload")
+
+    with profiler or contextlib.nullcontext():
+        bulk_replace_ocr_files(
+            csv_file=args.csv,
+            canvas_token=args.token,
+            base_url=args.base_url,
+            ocr_folder=args.ocr_folder,
+            file_id_col=args.file_id_column,
+            ocr_path_col=args.filename_column,
+            row_pause=args.row_pause,
+            failures_csv=args.failures_csv,
+            ledger_path=args.ledger,
+            use_ledger=not args.no_ledger,
+            verify_ledger=args.verify_ledger,
+            course_id_column=args.course_id_column,
+            bulk_metadata=not args.no_bulk_metadata,
+            folder_id_column=args.folder_id_column,
+            display_name_column=args.display_name_column,
+            layout=args.layout,
+            has_text_list=args.has_text_list,
+            shard=args.shard,
+            manifest_path=args.manifest,
+            use_manifest=not args.no_manifest,
+            limiter=limiter,
+            watchdog=watchdog,
+            workers=args.workers,
+            order=args.order,
+            profiler=profiler,
+        )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,226 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+# ========== Bandwidth Limits and Schedule Windows ==========
+#
+# One BandwidthLimiter is shared by every transfer in a process (downloads, uploads, and all
+# web jobs), so the cap is a total, not per file.
+#
+# A schedule is a ";"-separated list of windows, each "DAYS HH:MM-HH:MM=LIMIT":
+#
+#     Mon-Fri 08:00-18:00=512KB; Sat 09:00-13:00=pause
+#
+# DAYS is a day, a range (Mon-Fri) or a comma list (Mon,Wed); LIMIT is a rate like 2MB or
+# 256KB (per second), "unlimited", or "pause". Windows may wrap past midnight (22:00-02:00
+# belongs to the day it starts on). Outside every window the base limit applies. The first
+# matching window wins.
+#
+# A pause never cuts a transfer short: the file in flight finishes at the base limit, and the
+# job waits before starting the next one.
+
+BANDWIDTH_ENV_VAR = "CANVAS_BANDWIDTH_LIMIT"
+SCHEDULE_ENV_VAR = "CANVAS_TRANSFER_SCHEDULE"
+PAUSE = "pause"
+UNLIMITED = "unlimited"
+DAYS = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+RATE_UNITS = {"GB": 1024 ** 3, "MB": 1024 ** 2, "KB": 1024, "B": 1}
+# The schedule is re-evaluated at most this often while transferring.
+SCHEDULE_CHECK_SECONDS = 15
+PAUSE_POLL_SECONDS = 30
+
+
+def parse_rate(text):
+    """
+    Parses "2MB", "512KB/s" or "1048576" into bytes/sec. Returns None for unlimited, 0 for pause.
+    """
+    value = str(text).strip().upper().replace("/S", "")
+    if not value or value == UNLIMITED.upper():
+        return None
+    if value == PAUSE.upper():
+        return 0
+    for unit in ("GB", "MB", "KB", "B"):
+        if value.endswith(unit):
+            rate = float(value[: -len(unit)]) * RATE_UNITS[unit]
+            break
+    else:
+        rate = float(value)
+    if rate <= 0:
+        raise ValueError(f"Bandwidth limit must be positive, got '{text}'.")
+    return rate
+
+
+def format_rate(rate):
+    if rate is None:
+        return UNLIMITED
+    if rate == 0:
+        return PAUSE
+    if rate >= RATE_UNITS["MB"]:
+        return f"{rate / RATE_UNITS['MB']:.1f} MB/s"
+    return f"{rate / RATE_UNITS['KB']:.0f} KB/s"
+
+
+def _parse_days(text):
+    days = set()
+    for part in text.lower().split(","):
+        if "-" in part:
+            first, last = (DAYS.index(d.strip()[:3]) for d in part.split("-"))
+            span = (last - first) % 7
+            days.update((first + i) % 7 for i in range(span + 1))
+        else:
+            days.add(DAYS.index(part.strip()[:3]))
+    return days
+
+
+def _parse_minutes(text):
+    hours, minutes = text.strip().split(":")
+    value = int(hours) * 60 + int(minutes)
+    if not 0 <= value <= 24 * 60:
+        raise ValueError(f"Invalid time '{text}'.")
+    return value
+
+
+class ScheduleWindow:
+    def __init__(self, days, start, end, rate, text=""):
+        self.days = days
+        self.start = start
+        self.end = end
+        self.rate = rate
+        self.text = text
+
+    def contains(self, when):
+        minute = when.hour * 60 + when.minute
+        today = when.weekday()
+        if self.start < self.end:
+            return today in self.days and self.start <= minute < self.end
+        # Wraps past midnight: the early-morning part belongs to yesterday's window.
+        yesterday = (today - 1) % 7
+        return (today in self.days and minute >= self.start) or (yesterday in self.days and minute < self.end)
+
+
+def parse_schedule(text):
+    """
+    Parses a schedule string into a list of ScheduleWindow. Raises ValueError when invalid.
+    """
+    windows = []
+    for part in (text or "").split(";"):
+        part = part.strip()
+        if not part:
+            continue
+        try:
+            spec, limit = part.split("=", 1)
+            days, hours = spec.split()
+            start, end = hours.split("-")
+            windows.append(ScheduleWindow(
+                _parse_days(days), _parse_minutes(start), _parse_minutes(end), parse_rate(limit), part
+            ))
+        except ValueError as e:
+            raise ValueError(f"Invalid schedule window '{part}' (expected e.g. 'Mon-Fri 08:00-18:00=1MB'): {e}")
+    return windows
+
+
+class BandwidthLimiter:
+    """
+    Token bucket capping the combined transfer rate, with the rate taken from the schedule.
+
+    ``throttle(nbytes)`` is called after each chunk is sent or received and sleeps long enough
+    to keep the average at the current limit; up to one second of traffic can burst.
+    ``wait_for_window()`` is called between files and blocks while a "pause" window is active.
+    """
+
+    def __init__(self, rate=None, windows=None, clock=datetime.now):
+        self.base_rate = rate
+        self.windows = windows or []
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.tokens = 0.0
+        self.updated = time.monotonic()
+        self.current_rate = rate
+        self.checked = 0.0
+
+    @property
+    def active(self):
+        return self.base_rate is not None or bool(self.windows)
+
+    def scheduled_rate(self, when=None):
+        when = when or self.clock()
+        for window in self.windows:
+            if window.contains(when):
+                return window.rate
+        return self.base_rate
+
+    def _refresh_rate(self, now):
+        if self.windows and now - self.checked >= SCHEDULE_CHECK_SECONDS:
+            rate = self.scheduled_rate()
+            if rate != self.current_rate:
+                print(f"[Bandwidth] Limit is now {format_rate(rate)}.")
+            self.current_rate = rate
+            self.checked = now
+
+    def throttle(self, nbytes):
+        if not self.active or not nbytes:
+            return
+        with self.lock:
+            now = time.monotonic()
+            self._refresh_rate(now)
+            # Mid-transfer a pause window falls back to the base limit; see wait_for_window.
+            rate = self.current_rate if self.current_rate != 0 else self.base_rate
+            if rate is None:
+                return
+            self.tokens = min(rate, self.tokens + (now - self.updated) * rate) - nbytes
+            self.updated = now
+            wait = -self.tokens / rate if self.tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+
+    def wait_for_window(self, label=""):
+        """
+        Blocks while the schedule says "pause". Returns the seconds spent waiting.
+        """
+        if not self.windows:
+            return 0
+        waited = 0
+        announced = False
+        while self.scheduled_rate() == 0:
+            if not announced:
+                resume = self.next_change()
+                until = f" until {resume:%a %H:%M}" if resume else ""
+                print(f"[Bandwidth] Transfers paused by the schedule{until}{label}.")
+                announced = True
+            time.sleep(PAUSE_POLL_SECONDS)
+            waited += PAUSE_POLL_SECONDS
+        if announced:
+            print("[Bandwidth] Schedule allows transfers again. Resuming.")
+        return waited
+
+    def next_change(self, horizon_hours=24 * 8):
+        """
+        Approximate time (to the minute) when the scheduled rate next changes, or None.
+        """
+        now = self.clock().replace(second=0, microsecond=0)
+        current = self.scheduled_rate(now)
+        for minute in range(1, horizon_hours * 60):
+            when = now + timedelta(minutes=minute)
+            if self.scheduled_rate(when) != current:
+                return when
+        return None
+
+    def describe(self):
+        text = f"base limit {format_rate(self.base_rate)}"
+        if self.windows:
+            text += "; windows: " + "; ".join(w.text for w in self.windows)
+        return text
+
+
+def limiter_from_settings(bandwidth_limit=None, schedule=None):
+    """
+    Builds a BandwidthLimiter from CLI/UI values, falling back to CANVAS_BANDWIDTH_LIMIT and
+    CANVAS_TRANSFER_SCHEDULE. Raises ValueError for invalid values.
+    """
+    bandwidth_limit = bandwidth_limit if bandwidth_limit is not None else os.getenv(BANDWIDTH_ENV_VAR, "")
+    schedule = schedule if schedule is not None else os.getenv(SCHEDULE_ENV_VAR, "")
+    rate = parse_rate(bandwidth_limit)
+    if rate == 0:
+        raise ValueError("Use a schedule window to pause transfers; the base limit must be a rate.")
+    return BandwidthLimiter(rate, parse_schedule(schedule))
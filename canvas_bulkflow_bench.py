@@ -0,0 +1,283 @@
+import argparse
+import contextlib
+import csv
+import json
+import multiprocessing
+import os
+import queue
+import sys
+import tempfile
+import time
+
+from canvas_bulkflow_mock_server import start_mock_server
+
+# ========== Defaults ==========
+
+DEFAULT_ROW_COUNTS = "10,100"
+DEFAULT_FILE_SIZES = "64KB,1MB"
+DEFAULT_TOLERANCE = 0.2
+DEFAULT_CASE_TIMEOUT = 3600
+RESULT_POLL_SECONDS = 1.0
+MOCK_TOKEN = "mock-token"
+SIZE_UNITS = {"B": 1, "KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3}
+
+
+def parse_size(text):
+    """
+    Parses sizes like ``512``, ``64KB`` or ``1.5MB`` into bytes.
+    """
+    value = text.strip().upper()
+    for unit in ("GB", "MB", "KB", "B"):
+        if value.endswith(unit):
+            return int(float(value[: -len(unit)]) * SIZE_UNITS[unit])
+    return int(value)
+
+
+def peak_rss_bytes():
+    """
+    Peak resident set size of the current process, or None when the platform can't tell us.
+    """
+    try:
+        import resource
+    except ImportError:
+        resource = None
+
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, macOS reports bytes.
+        return peak if sys.platform == "darwin" else peak * 1024
+
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [
+                ("cb", wintypes.DWORD),
+                ("PageFaultCount", wintypes.DWORD),
+                ("PeakWorkingSetSize", ctypes.c_size_t),
+                ("WorkingSetSize", ctypes.c_size_t),
+                ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                ("PagefileUsage", ctypes.c_size_t),
+                ("PeakPagefileUsage", ctypes.c_size_t),
+            ]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        handle = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+            return counters.PeakWorkingSetSize
+    return None
+
+
+def write_ally_csv(path, row_count, course_count=1):
+    """
+    Writes an Ally-style CSV matching the files served by the mock server.
+    """
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Id", "Name", "Mime type", "Scanned:1", "Course id"])
+        for file_id in range(1, row_count + 1):
+            course_id = (file_id - 1) % course_count + 1
+            writer.writerow([file_id, f"scan_{file_id}.pdf", "application/pdf", 1, course_id])
+
+
+def _run_case(action, kwargs, verbose, results):
+    """
+    Runs one workload in a child process so peak RSS belongs to that workload alone.
+    """
+    from canvas_bulk_download import run_download
+    from canvas_bulk_upload import bulk_replace_ocr_files
+
+    func = run_download if action == "download" else bulk_replace_ocr_files
+    sink = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+    started = time.perf_counter()
+    with sink:
+        func(**kwargs)
+    elapsed = time.perf_counter() - started
+    results.put({"elapsed": elapsed, "peak_rss": peak_rss_bytes()})
+
+
+def run_benchmark(
+    action, server, base_url, workdir, row_count, file_size, verbose=False, timeout=DEFAULT_CASE_TIMEOUT
+):
+    csv_path = os.path.join(workdir, "ally.csv")
+    download_folder = os.path.join(workdir, "Downloads")
+    if action == "download":
+        kwargs = {
+            "csv_file": csv_path,
+            "canvas_token": MOCK_TOKEN,
+            "base_url": base_url,
+            "output_folder": download_folder,
+            "row_pause": 0,
+        }
+    else:
+        # Upload re-sends what the download step saved, standing in for Abbyy's output.
+        kwargs = {
+            "csv_file": csv_path,
+            "canvas_token": MOCK_TOKEN,
+            "base_url": base_url,
+            "ocr_folder": download_folder,
+            "file_id_col": "Id",
+            "ocr_path_col": "Name",
+            "row_pause": 0,
+        }
+
+    state = server.app.config["MOCK_STATE"]
+    with state.lock:
+        before = dict(state.stats)
+
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    proc = ctx.Process(target=_run_case, args=(action, kwargs, verbose, results))
+    proc.start()
+    outcome, error = None, None
+    deadline = time.monotonic() + timeout
+    while outcome is None:
+        try:
+            outcome = results.get(timeout=RESULT_POLL_SECONDS)
+        except queue.Empty:
+            if not proc.is_alive():
+                # The child may have put its result just before exiting.
+                try:
+                    outcome = results.get(timeout=RESULT_POLL_SECONDS)
+                except queue.Empty:
+                    error = f"worker exited with code {proc.exitcode} before reporting"
+                    break
+            elif time.monotonic() > deadline:
+                proc.terminate()
+                error = f"no result after {timeout:.0f}s"
+                break
+    proc.join()
+    if error:
+        return {"action": action, "rows": row_count, "file_size": file_size, "error": error}
+
+    with state.lock:
+        after = dict(state.stats)
+    # Count what the server actually transferred, so failed rows don't inflate throughput.
+    # Uploads count once confirmed: a storage POST whose confirm step failed is retried.
+    if action == "download":
+        files = after["downloads"] - before["downloads"]
+        total_bytes = after["downloaded_bytes"] - before["downloaded_bytes"]
+    else:
+        files = after["confirmed_uploads"] - before["confirmed_uploads"]
+        total_bytes = after["confirmed_bytes"] - before["confirmed_bytes"]
+
+    elapsed = outcome["elapsed"] or 1e-9
+    return {
+        "action": action,
+        "rows": row_count,
+        "file_size": file_size,
+        "files": files,
+        "requests": after["requests"] - before["requests"],
+        "seconds": round(elapsed, 3),
+        "files_per_sec": round(files / elapsed, 2),
+        "mb_per_sec": round(total_bytes / elapsed / SIZE_UNITS["MB"], 2),
+        "peak_rss_mb": round(outcome["peak_rss"] / SIZE_UNITS["MB"], 1) if outcome["peak_rss"] else None,
+    }
+
+
+def compare_results(results, baseline, tolerance):
+    """
+    Returns human readable regressions where files/sec dropped by more than ``tolerance``.
+    """
+    previous = {(r["action"], r["rows"], r["file_size"]): r for r in baseline}
+    regressions = []
+    for result in results:
+        before = previous.get((result["action"], result["rows"], result["file_size"]))
+        if result.get("error") or not before or not before.get("files_per_sec"):
+            continue
+        change = (result["files_per_sec"] - before["files_per_sec"]) / before["files_per_sec"]
+        if change < -tolerance:
+            regressions.append(
+                f"{result['action']} rows={result['rows']} size={result['file_size']}: "
+                f"{before['files_per_sec']} -> {result['files_per_sec']} files/sec ({change:+.0%})"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark download/upload against a local mock Canvas server.")
+    parser.add_argument("--rows", default=DEFAULT_ROW_COUNTS, help="Comma separated row counts")
+    parser.add_argument("--sizes", default=DEFAULT_FILE_SIZES, help="Comma separated file sizes (e.g. 64KB,1MB)")
+    parser.add_argument("--actions", default="download,upload", help="download, upload or both")
+    parser.add_argument("--courses", type=int, default=1, help="Number of mock courses the rows are spread across")
+    parser.add_argument("--latency", type=float, default=0.0, help="Mock server latency per request (seconds)")
+    parser.add_argument("--bandwidth", default=None, help="Mock server bandwidth per transfer (e.g. 10MB)")
+    parser.add_argument("--rate-limit", type=float, nargs=2, metavar=("CAPACITY", "REFILL"), default=None)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--results", default=None, help="Write results as JSON to this path")
+    parser.add_argument("--compare", default=None, help="Baseline results JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Allowed files/sec drop versus the baseline (0.2 = 20%%)")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_CASE_TIMEOUT,
+                        help="Give up on a case after this many seconds")
+    parser.add_argument("--verbose", action="store_true", help="Show the scripts' own output")
+    args = parser.parse_args()
+
+    row_counts = [int(r) for r in args.rows.split(",") if r.strip()]
+    file_sizes = [parse_size(s) for s in args.sizes.split(",") if s.strip()]
+    actions = [a.strip() for a in args.actions.split(",") if a.strip()]
+
+    results = []
+    for row_count in row_counts:
+        for file_size in file_sizes:
+            server, base_url = start_mock_server(
+                file_count=row_count,
+                file_size=file_size,
+                course_count=args.courses,
+                latency=args.latency,
+                bandwidth=parse_size(args.bandwidth) if args.bandwidth else None,
+                rate_limit=tuple(args.rate_limit) if args.rate_limit else None,
+                failure_rate=args.failure_rate,
+                seed=args.seed,
+            )
+            try:
+                with tempfile.TemporaryDirectory(prefix="bulkflow_bench_") as workdir:
+                    write_ally_csv(os.path.join(workdir, "ally.csv"), row_count, args.courses)
+                    for action in actions:
+                        result = run_benchmark(
+                            action, server, base_url, workdir, row_count, file_size, args.verbose, args.timeout
+                        )
+                        results.append(result)
+                        if result.get("error"):
+                            print(f"{action:<8} rows={row_count:<6} size={file_size:<10} FAILED: {result['error']}")
+                            continue
+                        print(
+                            f"{action:<8} rows={row_count:<6} size={file_size:<10} files={result['files']:<6} "
+                            f"{result['seconds']:>8.2f}s {result['files_per_sec']:>9.2f} files/s "
+                            f"{result['mb_per_sec']:>8.2f} MB/s peak RSS {result['peak_rss_mb']} MB"
+                        )
+            finally:
+                server.shutdown()
+
+    if args.results:
+        with open(args.results, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.results}")
+
+    failed = [r for r in results if r.get("error")]
+    if failed:
+        print(f"\n{len(failed)} case(s) failed to report a result.")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_results(results, baseline, args.tolerance)
+        if regressions:
+            print("\n=== REGRESSIONS ===")
+            for line in regressions:
+                print(f"  - {line}")
+            sys.exit(1)
+        print("No regressions against baseline.")
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
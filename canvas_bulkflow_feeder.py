@@ -0,0 +1,283 @@
+import argparse
+import math
+import os
+import shutil
+import threading
+import time
+from collections import deque
+
+from canvas_bulkflow_ocr_index import PDF_EXTENSION, OcrFolderIndex
+
+# ========== Hot Folder Feeding ==========
+#
+# Dropping thousands of PDFs into the hot folder at once leaves Abbyy with a queue it can't
+# keep up with. In feeder mode downloads are saved to a holding folder instead (outside the
+# hot folder, with the same subfolder layout) and moved into the hot folder in batches.
+#
+# A released file counts as done once its OCRed output shows up (matched the same way the
+# upload step matches names). The feeder measures how fast outputs appear and keeps about
+# LEAD_SECONDS of work queued in the hot folder: enough that Abbyy never waits, few enough
+# that it doesn't thrash. Until the first output appears it releases a single starting batch.
+
+DEFAULT_HOLDING_FOLDER_NAME = "Holding"
+DEFAULT_OCR_FOLDER_NAME = "OCRed"
+DEFAULT_FEED_INTERVAL = 30
+DEFAULT_MIN_BATCH = 10
+DEFAULT_MAX_BATCH = 200
+DEFAULT_LEAD_SECONDS = 300
+# OCR rate is measured over this trailing window.
+RATE_WINDOW_SECONDS = 900
+# A released file with no output after this long stops counting as queued (Abbyy skipped it).
+DEFAULT_STALE_SECONDS = 3600
+# finish() gives up, leaving the rest in the holding folder, after this many checks in a row
+# where nothing could be moved, or this many checks where released files went stale without
+# any OCR output appearing in between (Abbyy isn't processing the hot folder).
+MAX_MOVE_FAILURES = 5
+MAX_STALE_CYCLES = 2
+PART_SUFFIX = ".part"
+
+
+def default_holding_folder(output_folder):
+    """
+    Holding folder next to the hot folder, so a hot folder that processes subfolders never sees it.
+    """
+    parent = os.path.dirname(os.path.abspath(output_folder))
+    return os.path.join(parent, DEFAULT_HOLDING_FOLDER_NAME)
+
+
+def _move(source, target):
+    try:
+        os.replace(source, target)
+    except OSError:
+        # Different drive: copy under a name the hot folder ignores, then rename.
+        shutil.copy2(source, target + PART_SUFFIX)
+        os.replace(target + PART_SUFFIX, target)
+        os.remove(source)
+
+
+class HotFolderFeeder:
+    """
+    Moves PDFs from a holding folder into the hot folder at the rate Abbyy produces output.
+
+    ``start()`` feeds on a background thread while the download runs; ``finish()`` keeps
+    feeding until the holding folder is empty. ``step()`` does one pass and can also be
+    driven directly.
+    """
+
+    def __init__(
+        self,
+        hot_folder,
+        ocr_folder,
+        holding_folder=None,
+        interval=DEFAULT_FEED_INTERVAL,
+        min_batch=DEFAULT_MIN_BATCH,
+        max_batch=DEFAULT_MAX_BATCH,
+        lead_seconds=DEFAULT_LEAD_SECONDS,
+        stale_seconds=DEFAULT_STALE_SECONDS,
+    ):
+        self.hot_folder = hot_folder
+        self.ocr_folder = ocr_folder
+        self.holding_folder = holding_folder or default_holding_folder(hot_folder)
+        self.interval = interval
+        self.min_batch = max(1, min_batch)
+        self.max_batch = max(self.min_batch, max_batch)
+        self.lead_seconds = lead_seconds
+        self.stale_seconds = stale_seconds
+        self.index = None
+        self.outstanding = {}  # relative path -> time released
+        self.completions = deque()
+        self.released = 0
+        self.completed = 0
+        self.stale = 0
+        self.stale_cycles = 0
+        self.move_failures = 0
+        self.held = 0
+        self.started = None
+        self.stop_event = threading.Event()
+        self.thread = None
+        os.makedirs(self.holding_folder, exist_ok=True)
+
+    def hot_path(self, holding_path):
+        """
+        Where a file saved under the holding folder ends up once released.
+        """
+        return os.path.join(self.hot_folder, os.path.relpath(holding_path, self.holding_folder))
+
+    def _held_files(self):
+        files = []
+        for dirpath, _, filenames in os.walk(self.holding_folder):
+            for name in filenames:
+                # Partial downloads (.part) and files awaiting the text check (.inspect) aren't ready.
+                if name.lower().endswith(PDF_EXTENSION):
+                    path = os.path.join(dirpath, name)
+                    try:
+                        files.append((os.path.getmtime(path), os.path.relpath(path, self.holding_folder)))
+                    except OSError:
+                        continue
+        files.sort()
+        return [rel for _, rel in files]
+
+    def _collect_outputs(self, now):
+        if self.index is None:
+            self.index = OcrFolderIndex(self.ocr_folder)
+        else:
+            self.index.refresh()
+        completed, stale = self.completed, self.stale
+        for rel, released_at in list(self.outstanding.items()):
+            if self.index.resolve(os.path.basename(rel), os.path.dirname(rel)):
+                del self.outstanding[rel]
+                self.completed += 1
+                self.completions.append(now)
+            elif now - released_at > self.stale_seconds:
+                del self.outstanding[rel]
+                self.stale += 1
+                print(f"[Feeder] No OCR output for {rel} after {self.stale_seconds / 60:.0f} min. "
+                      f"No longer counting it as queued.")
+        if self.completed > completed:
+            self.stale_cycles = 0
+        elif self.stale > stale:
+            self.stale_cycles += 1
+        while self.completions and now - self.completions[0] > RATE_WINDOW_SECONDS:
+            self.completions.popleft()
+
+    @property
+    def rate(self):
+        """
+        OCR outputs per second over the trailing window, or None before the first one.
+        """
+        if not self.completions or self.started is None:
+            return None
+        span = min(RATE_WINDOW_SECONDS, time.monotonic() - self.started)
+        return len(self.completions) / max(span, 1.0)
+
+    def target_queue(self):
+        rate = self.rate
+        if rate is None:
+            return self.min_batch
+        return max(self.min_batch, math.ceil(rate * self.lead_seconds))
+
+    def step(self):
+        """
+        Counts new OCR outputs and releases the next batch. Returns the number of files moved.
+        """
+        now = time.monotonic()
+        self._collect_outputs(now)
+        held = self._held_files()
+        self.held = len(held)
+        batch = min(self.max_batch, self.target_queue() - len(self.outstanding), len(held))
+        moved = 0
+        failed = 0
+        for rel in held[:max(0, batch)]:
+            target = os.path.join(self.hot_folder, rel)
+            try:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                _move(os.path.join(self.holding_folder, rel), target)
+            except OSError as e:
+                print(f"[Feeder] Could not move {rel} into the hot folder: {e}")
+                failed += 1
+                continue
+            self.outstanding[rel] = now
+            moved += 1
+        if moved:
+            self.move_failures = 0
+        elif failed:
+            self.move_failures += 1
+        if moved:
+            if self.started is None:
+                self.started = now
+            self.released += moved
+            self.held -= moved
+            rate = self.rate
+            measured = f"{rate * 60:.1f}/min" if rate is not None else "not measured yet"
+            print(f"[Feeder] Released {moved} files to the hot folder ({len(self.outstanding)} queued, "
+                  f"{self.held} held, OCR rate {measured}).")
+        return moved
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            try:
+                self.step()
+            except OSError as e:
+                print(f"[Feeder] {e}")
+            self.stop_event.wait(self.interval)
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="hot-folder-feeder", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+    def finish(self, progress_cb=None):
+        """
+        Stops the background thread and keeps feeding until nothing is left to release, or
+        until files can't be moved or Abbyy stops producing output (see MAX_MOVE_FAILURES and
+        MAX_STALE_CYCLES). Anything not released stays in the holding folder.
+        """
+        self.stop()
+        while True:
+            self.step()
+            if not self.held:
+                break
+            if self.move_failures >= MAX_MOVE_FAILURES:
+                print(f"[Feeder] Could not move any file for {self.move_failures} checks in a row. Giving up.")
+                break
+            if self.stale_cycles >= MAX_STALE_CYCLES:
+                print(f"[Feeder] Released files keep going without OCR output; Abbyy doesn't seem to be "
+                      f"processing {self.hot_folder}. Giving up.")
+                break
+            if progress_cb:
+                progress_cb(self.held, len(self.outstanding))
+            time.sleep(self.interval)
+
+    def print_summary(self):
+        rate = self.rate
+        measured = f", OCR rate {rate * 60:.1f} files/min" if rate is not None else ""
+        print(f"Hot folder feeder: released {self.released} files, {self.completed} OCRed outputs seen{measured}.")
+        if self.stale:
+            print(f"  {self.stale} released files never produced an OCR output.")
+        if self.held:
+            print(f"  {self.held} files were not released and are still in {self.holding_folder}. "
+                  f"Run canvas_bulkflow_feeder.py to feed them later.")
+
+
+# ========== Script Entry Point ==========
+def main():
+    parser = argparse.ArgumentParser(
+        description="Feed PDFs from a holding folder into the Abbyy hot folder at its OCR rate."
+    )
+    parser.add_argument("--hot-folder", required=True, help="Abbyy hot folder (the download folder)")
+    parser.add_argument("--ocr-folder", default=None,
+                        help=f"Abbyy output folder (default: <hot-folder>/{DEFAULT_OCR_FOLDER_NAME})")
+    parser.add_argument("--holding-folder", default=None,
+                        help=f"Folder of held PDFs (default: {DEFAULT_HOLDING_FOLDER_NAME} next to the hot folder)")
+    parser.add_argument("--interval", type=float, default=DEFAULT_FEED_INTERVAL,
+                        help="Seconds between checks")
+    parser.add_argument("--min-batch", type=int, default=DEFAULT_MIN_BATCH,
+                        help="Files queued before the OCR rate is known, and the smallest queue kept")
+    parser.add_argument("--max-batch", type=int, default=DEFAULT_MAX_BATCH, help="Most files released per check")
+    parser.add_argument("--lead", type=float, default=DEFAULT_LEAD_SECONDS,
+                        help="Seconds of OCR work to keep queued in the hot folder")
+    args = parser.parse_args()
+
+    feeder = HotFolderFeeder(
+        args.hot_folder,
+        args.ocr_folder or os.path.join(args.hot_folder, DEFAULT_OCR_FOLDER_NAME),
+        holding_folder=args.holding_folder,
+        interval=args.interval,
+        min_batch=args.min_batch,
+        max_batch=args.max_batch,
+        lead_seconds=args.lead,
+    )
+    try:
+        feeder.finish()
+    except KeyboardInterrupt:
+        print("Stopped. Files not yet released are still in the holding folder.")
+    feeder.print_summary()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import os
+
+# ========== Output Layouts ==========
+#
+# "flat"    - every PDF directly in the folder (original behaviour)
+# "course"  - one subfolder per Canvas course: course_<course id>/
+# "file-id" - 1000 subfolders named after the last three digits of the file id: 000/ .. 999/
+#
+# The file-id layout buckets on the trailing digits because Canvas ids handed out around
+# the same time share their leading digits, which would put almost everything in one folder.
+# Both sharded layouts are derived from the CSV row alone, so download and upload always
+# agree on where a given file id lives.
+
+LAYOUT_FLAT = "flat"
+LAYOUT_COURSE = "course"
+LAYOUT_FILE_ID = "file-id"
+LAYOUTS = (LAYOUT_FLAT, LAYOUT_COURSE, LAYOUT_FILE_ID)
+DEFAULT_LAYOUT = LAYOUT_FLAT
+
+FILE_ID_BUCKETS = 1000
+UNKNOWN_COURSE_DIR = "course_unknown"
+
+
+def shard_subdir(layout, file_id, course_id=None):
+    """
+    Returns the subfolder (relative, "" for flat) that holds the file for this row.
+    """
+    if layout == LAYOUT_FLAT or not layout:
+        return ""
+    if layout == LAYOUT_COURSE:
+        return f"course_{int(course_id)}" if course_id is not None else UNKNOWN_COURSE_DIR
+    if layout == LAYOUT_FILE_ID:
+        return f"{int(float(file_id)) % FILE_ID_BUCKETS:03d}"
+    raise ValueError(f"Unknown folder layout '{layout}'. Expected one of: {', '.join(LAYOUTS)}")
+
+
+def shard_path(folder, layout, file_id, name, course_id=None):
+    return os.path.join(folder, shard_subdir(layout, file_id, course_id), name)
+
+
+class ShardFolders:
+    """
+    Creates shard subfolders on first use, remembering which ones already exist so a
+    large run doesn't pay an extra filesystem call per file.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.created = set()
+
+    def ensure(self, subdir):
+        path = os.path.join(self.root, subdir)
+        if subdir not in self.created:
+            os.makedirs(path, exist_ok=True)
+            self.created.add(subdir)
+        return path
+
+
+# ========== Run Files ==========
+#
+# CSVs and reports a run leaves behind (failure lists, manifest, snapshot, has-text list,
+# profiles) go in the folder that contains the download folder, never inside it: the download
+# folder is Abbyy's hot folder, and with "process subfolders" on it picks up whatever is there.
+
+def run_files_folder(download_folder):
+    """
+    Folder for a run's CSVs and reports: the one containing the download (hot) folder.
+    """
+    return os.path.dirname(os.path.abspath(download_folder))
+
+
+def run_file_path(download_folder, filename):
+    """
+    Path of a run file kept across runs. One an earlier version left inside the download
+    folder keeps being used until it's moved next to the folder.
+    """
+    path = os.path.join(run_files_folder(download_folder), filename)
+    legacy = os.path.join(download_folder, filename)
+    if not os.path.exists(path) and os.path.exists(legacy):
+        return legacy
+    return path
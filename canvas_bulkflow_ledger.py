@@ -0,0 +1,120 @@
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime, timezone
+
+# ========== Defaults ==========
+
+DEFAULT_LEDGER_FILENAME = "upload_ledger.jsonl"
+DIGEST_CHUNK_SIZE = 1024 * 1024
+
+
+def file_digest(path, chunk_size=DIGEST_CHUNK_SIZE):
+    """
+    Returns the SHA-256 hex digest of a local file.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class UploadLedger:
+    """
+    Append-only record of successful replacements, keyed by Canvas file id.
+
+    Each line is a JSON object with the local file digest plus the size and ``updated_at``
+    Canvas reported after the upload. The newest line for a file id wins, so the file can
+    simply be appended to from several runs and is safe to inspect or trim by hand.
+    """
+
+    def __init__(self, path, base_url=""):
+        self.path = path
+        self.base_url = base_url.rstrip("/")
+        self.entries = {}
+        self.lock = threading.Lock()
+        self._load()
+
+    @staticmethod
+    def _key(file_id):
+        return str(int(float(file_id)))
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A run killed mid-write can leave a partial last line.
+                    continue
+                if entry.get("base_url", "") != self.base_url:
+                    continue
+                self.entries[str(entry.get("file_id"))] = entry
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, file_id):
+        return self.entries.get(self._key(file_id))
+
+    def local_digest(self, file_id, local_path):
+        """
+        Digest of ``local_path``, reusing the ledger's value when size and mtime are unchanged
+        so reruns don't have to re-read every PDF.
+        """
+        stat = os.stat(local_path)
+        entry = self.get(file_id)
+        if (
+            entry
+            and entry.get("local_size") == stat.st_size
+            and entry.get("local_mtime_ns") == stat.st_mtime_ns
+            and entry.get("digest")
+        ):
+            return entry["digest"]
+        return file_digest(local_path)
+
+    def is_replaced(self, file_id, digest):
+        entry = self.get(file_id)
+        return bool(entry and entry.get("digest") == digest)
+
+    def matches_canvas(self, file_id, file_info):
+        """
+        True when live Canvas metadata still matches what we recorded after our upload.
+        """
+        entry = self.get(file_id)
+        if not entry or not file_info:
+            return False
+        return (
+            entry.get("canvas_size") is not None
+            and entry.get("canvas_size") == file_info.get("size")
+            and entry.get("updated_at") is not None
+            and entry.get("updated_at") == file_info.get("updated_at")
+        )
+
+    def record(self, file_id, digest, local_path, canvas_file):
+        stat = os.stat(local_path)
+        entry = {
+            "base_url": self.base_url,
+            "file_id": self._key(file_id),
+            "digest": digest,
+            "local_size": stat.st_size,
+            "local_mtime_ns": stat.st_mtime_ns,
+            "canvas_size": (canvas_file or {}).get("size"),
+            "updated_at": (canvas_file or {}).get("updated_at"),
+            "replaced_at": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        }
+        with self.lock:
+            self.entries[entry["file_id"]] = entry
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
@@ -0,0 +1,107 @@
+import csv
+import os
+import threading
+
+import pandas as pd
+
+from canvas_bulkflow_metadata import (
+    DEFAULT_COURSE_ID_COLUMN,
+    DEFAULT_DISPLAY_NAME_COLUMN,
+    DEFAULT_FOLDER_ID_COLUMN,
+)
+
+# ========== Download Manifest ==========
+#
+# One row per saved file, written as the download goes. The id/name columns match the upload
+# script's defaults and the context columns match what it already reads, so the manifest can
+# be used as the upload CSV as it is, or merged into the Ally CSV (see apply_manifest).
+
+DEFAULT_MANIFEST_FILENAME = "download_manifest.csv"
+MANIFEST_ID_COLUMN = "Id"
+MANIFEST_NAME_COLUMN = "Name"
+MANIFEST_SIZE_COLUMN = "Size"
+MANIFEST_DIGEST_COLUMN = "Sha256"
+MANIFEST_PATH_COLUMN = "Path"
+MANIFEST_COLUMNS = [
+    MANIFEST_ID_COLUMN,
+    MANIFEST_NAME_COLUMN,
+    DEFAULT_COURSE_ID_COLUMN,
+    DEFAULT_FOLDER_ID_COLUMN,
+    DEFAULT_DISPLAY_NAME_COLUMN,
+    MANIFEST_SIZE_COLUMN,
+    MANIFEST_DIGEST_COLUMN,
+    MANIFEST_PATH_COLUMN,
+]
+
+
+class DownloadManifest:
+    """
+    Appends a row per downloaded file and flushes it immediately, so an interrupted run still
+    leaves a usable manifest. Reruns append; readers keep the last row for each file id.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, "a", newline="", encoding="utf-8")
+        self.writer = csv.writer(self.file)
+        if new_file:
+            self.writer.writerow(MANIFEST_COLUMNS)
+            self.file.flush()
+        self.count = 0
+
+    def record(self, file_id, name, course_id, file_info, size, digest, path):
+        row = [
+            int(float(file_id)),
+            name,
+            course_id if course_id is not None else "",
+            file_info.get("folder_id") or "",
+            file_info.get("display_name") or "",
+            size,
+            digest,
+            path,
+        ]
+        with self.lock:
+            self.writer.writerow(row)
+            self.file.flush()
+            self.count += 1
+
+    def close(self):
+        self.file.close()
+
+
+def apply_manifest(
+    df,
+    manifest_path,
+    file_id_column,
+    course_id_column=DEFAULT_COURSE_ID_COLUMN,
+    folder_id_column=DEFAULT_FOLDER_ID_COLUMN,
+    display_name_column=DEFAULT_DISPLAY_NAME_COLUMN,
+):
+    """
+    Fills the context columns of ``df`` from a download manifest, keeping any value the CSV
+    already has. Returns (df, matched_rows).
+    """
+    manifest = pd.read_csv(manifest_path)
+    if MANIFEST_ID_COLUMN not in manifest.columns:
+        print(f"[Manifest] {manifest_path} has no '{MANIFEST_ID_COLUMN}' column; ignoring it.")
+        return df, 0
+
+    manifest["_file_id"] = pd.to_numeric(manifest[MANIFEST_ID_COLUMN], errors="coerce")
+    manifest = manifest.dropna(subset=["_file_id"]).drop_duplicates("_file_id", keep="last").set_index("_file_id")
+    file_ids = pd.to_numeric(df[file_id_column], errors="coerce")
+    matched = file_ids.isin(manifest.index)
+
+    df = df.copy()
+    pairs = [
+        (course_id_column, DEFAULT_COURSE_ID_COLUMN),
+        (folder_id_column, DEFAULT_FOLDER_ID_COLUMN),
+        (display_name_column, DEFAULT_DISPLAY_NAME_COLUMN),
+    ]
+    for column, manifest_column in pairs:
+        if not column or manifest_column not in manifest.columns:
+            continue
+        values = file_ids.map(manifest[manifest_column])
+        df[column] = df[column].where(df[column].notna(), values) if column in df.columns else values
+    return df, int(matched.sum())
@@ -0,0 +1,203 @@
+import pandas as pd
+import requests
+
+from canvas_bulkflow_retry import (
+    TransientTransferError,
+    raise_for_transient_exception,
+    raise_for_transient_status,
+)
+
+# ========== Defaults ==========
+
+DEFAULT_COURSE_ID_COLUMN = "Course id"
+DEFAULT_FOLDER_ID_COLUMN = "Folder id"
+DEFAULT_DISPLAY_NAME_COLUMN = "Display name"
+DEFAULT_PER_PAGE = 100
+# Listing a course costs one request per 100 files, so it only pays off when
+# the CSV covers enough of that course's files.
+DEFAULT_MIN_ROWS_PER_COURSE = 5
+# Listing pages allowed per wanted file before the rest fall back to per-file lookups,
+# so a large course with few CSV rows never costs more than looking them up one by one.
+DEFAULT_MAX_PAGES_PER_ROW = 1
+DEFAULT_REQUEST_TIMEOUT = 30
+
+
+def _to_int(value):
+    try:
+        if pd.isna(value):
+            return None
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def row_context(row, course_id_column, folder_id_column, display_name_column):
+    """
+    Reads (course_id, folder_id, display_name) from a CSV row. Each part is None when the
+    column is absent or the value doesn't look valid (ids must be positive integers).
+    """
+    course_id = _to_int(row.get(course_id_column)) if course_id_column else None
+    folder_id = _to_int(row.get(folder_id_column)) if folder_id_column else None
+    display_name = row.get(display_name_column) if display_name_column else None
+    if not isinstance(display_name, str) or not display_name.strip():
+        display_name = None
+    return (
+        course_id if course_id and course_id > 0 else None,
+        folder_id if folder_id and folder_id > 0 else None,
+        display_name,
+    )
+
+
+def complete_context_mask(df, course_id_column, folder_id_column, display_name_column):
+    """
+    Boolean Series marking rows whose CSV context is complete enough to skip metadata lookups.
+    """
+    columns = [course_id_column, folder_id_column, display_name_column]
+    if not all(column in df.columns for column in columns):
+        return pd.Series(False, index=df.index)
+    return df[columns].notna().all(axis=1)
+
+
+def fetch_all_pages(url, headers, params=None, timeout=DEFAULT_REQUEST_TIMEOUT, stop=None, max_pages=None):
+    """
+    GETs a Canvas list endpoint and follows ``Link: rel="next"`` until the last page, until
+    ``stop(page_items)`` returns True, or until ``max_pages`` pages have been read.
+    Returns (items, request_count), or (None, request_count) on a non-retryable failure.
+    Raises TransientTransferError for timeouts, 5xx and throttling.
+    """
+    items = []
+    requests_made = 0
+    params = dict(params or {})
+    params.setdefault("per_page", DEFAULT_PER_PAGE)
+    while url:
+        try:
+            resp = requests.get(url, headers=headers, params=params, timeout=timeout)
+        except requests.RequestException as e:
+            raise_for_transient_exception(e, f"[fetch_all_pages] GET {url}")
+            print(f"[fetch_all_pages] Request failed for {url}: {e}")
+            return None, requests_made + 1
+        requests_made += 1
+        if resp.status_code != 200:
+            raise_for_transient_status(resp, f"[fetch_all_pages] GET {url}")
+            print(f"[fetch_all_pages] Failed for {url}. Status {resp.status_code}: {resp.text}")
+            return None, requests_made
+        page = resp.json()
+        items.extend(page)
+        if (stop and stop(page)) or (max_pages and requests_made >= max_pages):
+            break
+        # The next link already carries per_page and the page cursor.
+        url = resp.links.get("next", {}).get("url")
+        params = None
+    return items, requests_made
+
+
+class MetadataResolver:
+    """
+    Fills in file (and folder) metadata for whole courses at once using the paginated
+    ``/api/v1/courses/{id}/files`` and ``/api/v1/courses/{id}/folders`` listings.
+
+    Rows that the listings don't cover (courses below the threshold, rows without a course
+    id, files that moved) are left to the per-file lookups, so ``file_info`` / ``folder_info``
+    returning None just means "ask the API directly".
+    """
+
+    def __init__(self, base_url, headers, timeout=DEFAULT_REQUEST_TIMEOUT):
+        self.base_url = base_url
+        self.headers = headers
+        self.timeout = timeout
+        self.files = {}
+        self.folders = {}
+        self.folder_listed_courses = set()
+        self.request_count = 0
+
+    def prefetch(
+        self,
+        df,
+        file_id_column,
+        course_id_column=DEFAULT_COURSE_ID_COLUMN,
+        include_folders=False,
+        min_rows_per_course=DEFAULT_MIN_ROWS_PER_COURSE,
+        max_pages_per_row=DEFAULT_MAX_PAGES_PER_ROW,
+    ):
+        if course_id_column not in df.columns:
+            print(f"[Metadata] No '{course_id_column}' column in CSV; using per-file metadata lookups.")
+            return
+
+        wanted = {}
+        for file_id, course_id in zip(df[file_id_column], df[course_id_column]):
+            file_id = _to_int(file_id)
+            course_id = _to_int(course_id)
+            if file_id is not None and course_id is not None:
+                wanted.setdefault(course_id, set()).add(file_id)
+
+        dense_courses = {c: ids for c, ids in wanted.items() if len(ids) >= min_rows_per_course}
+        if not dense_courses:
+            print(f"[Metadata] No course has {min_rows_per_course}+ rows; using per-file metadata lookups.")
+            return
+
+        rows_in_dense = sum(len(ids) for ids in dense_courses.values())
+        print(f"[Metadata] Listing files for {len(dense_courses)} courses covering {rows_in_dense} rows...")
+        for course_id, file_ids in dense_courses.items():
+            try:
+                self._prefetch_course(course_id, file_ids, include_folders, max_pages_per_row)
+            except TransientTransferError as e:
+                # Not fatal: the rows of this course fall back to per-file lookups.
+                print(f"[Metadata] Listing course {course_id} failed: {e} Falling back to per-file lookups.")
+
+        per_file_requests = rows_in_dense * (2 if include_folders else 1)
+        print(f"[Metadata] Resolved {len(self.files)} of {rows_in_dense} rows with {self.request_count} "
+              f"listing requests (instead of {per_file_requests} per-file requests).")
+
+    def _prefetch_course(self, course_id, file_ids, include_folders, max_pages_per_row=DEFAULT_MAX_PAGES_PER_ROW):
+        url = f"{self.base_url}/api/v1/courses/{course_id}/files"
+        missing = set(file_ids)
+
+        def keep_wanted(page):
+            for info in page:
+                file_id = _to_int(info.get("id"))
+                # Only keep the rows we were asked about; big courses can list thousands of files.
+                if file_id in missing:
+                    self.files[file_id] = info
+                    missing.discard(file_id)
+            return not missing
+
+        max_pages = max(1, int(len(file_ids) * max_pages_per_row))
+        _, count = fetch_all_pages(url, self.headers, timeout=self.timeout, stop=keep_wanted, max_pages=max_pages)
+        self.request_count += count
+        if missing and count >= max_pages:
+            print(f"[Metadata] Stopped listing course {course_id} after {count} pages; "
+                  f"{len(missing)} files left to per-file lookups.")
+
+        if include_folders:
+            url = f"{self.base_url}/api/v1/courses/{course_id}/folders"
+            folders, count = fetch_all_pages(url, self.headers, timeout=self.timeout)
+            self.request_count += count
+            for info in folders or []:
+                folder_id = _to_int(info.get("id"))
+                if folder_id is not None:
+                    self.folders[folder_id] = info
+            if folders is not None:
+                self.folder_listed_courses.add(course_id)
+
+    def file_info(self, file_id):
+        return self.files.get(_to_int(file_id))
+
+    def folder_info(self, folder_id):
+        return self.folders.get(_to_int(folder_id))
+
+    def remember_folder(self, info):
+        """
+        Keeps a folder fetched by a per-file lookup so later rows in the same folder reuse it.
+        """
+        folder_id = _to_int((info or {}).get("id"))
+        if folder_id is not None:
+            self.folders[folder_id] = info
+
+    def folder_outside_course(self, folder_id, course_id):
+        """
+        True only when a listing proves ``folder_id`` is not one of ``course_id``'s folders.
+        """
+        info = self.folder_info(folder_id)
+        if not info:
+            return course_id in self.folder_listed_courses
+        return str(info.get("context_type")).lower() != "course" or _to_int(info.get("context_id")) != course_id
@@ -0,0 +1,380 @@
+import argparse
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from flask import Flask, Response, jsonify, request
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+# ========== Defaults ==========
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_FILE_COUNT = 100
+DEFAULT_FILE_SIZE = 1024 * 1024
+DEFAULT_COURSE_COUNT = 1
+STREAM_BLOCK_SIZE = 64 * 1024
+FOLDER_ID_OFFSET = 100000
+
+
+def _now_iso():
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _pdf_block():
+    """
+    A reusable block of fake PDF bytes. Downloads repeat it until the file size is reached.
+    """
+    header = b"%PDF-1.4\n% canvas bulkflow mock\n"
+    filler = b"0" * (STREAM_BLOCK_SIZE - len(header))
+    return header + filler
+
+
+class MockCanvasState:
+    """
+    In-memory files, folders and pending uploads for the mock Canvas server.
+
+    Courses are numbered from 1, each with a single root folder. Files are spread across
+    the courses round-robin and named ``scan_<id>.pdf``.
+    """
+
+    def __init__(
+        self,
+        file_count=DEFAULT_FILE_COUNT,
+        file_size=DEFAULT_FILE_SIZE,
+        course_count=DEFAULT_COURSE_COUNT,
+        latency=0.0,
+        bandwidth=None,
+        rate_limit=None,
+        failure_rate=0.0,
+        failure_status=503,
+        seed=None,
+    ):
+        self.lock = threading.Lock()
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self.random = random.Random(seed)
+
+        # Canvas style leaky bucket: (capacity, refill units per second).
+        self.rate_limit = rate_limit
+        self.rate_remaining = float(rate_limit[0]) if rate_limit else None
+        self.rate_checked_at = time.monotonic()
+
+        self.files = {}
+        self.files_by_name = {}
+        self.folders = {}
+        self.pending_uploads = {}
+        self.stats = {
+            "requests": 0,
+            "throttled": 0,
+            "failed": 0,
+            "downloads": 0,
+            "uploads": 0,
+            "confirmed_uploads": 0,
+            "downloaded_bytes": 0,
+            "uploaded_bytes": 0,
+            "confirmed_bytes": 0,
+        }
+
+        for course_id in range(1, course_count + 1):
+            folder_id = FOLDER_ID_OFFSET + course_id
+            self.folders[folder_id] = {
+                "id": folder_id,
+                "name": "course files",
+                "full_name": "course files",
+                "context_type": "Course",
+                "context_id": course_id,
+            }
+
+        for file_id in range(1, file_count + 1):
+            course_id = (file_id - 1) % course_count + 1
+            self.files[file_id] = {
+                "id": file_id,
+                "display_name": f"scan_{file_id}.pdf",
+                "filename": f"scan_{file_id}.pdf",
+                "content-type": "application/pdf",
+                "size": file_size,
+                "folder_id": FOLDER_ID_OFFSET + course_id,
+                "updated_at": _now_iso(),
+            }
+            self.files_by_name[(FOLDER_ID_OFFSET + course_id, f"scan_{file_id}.pdf")] = file_id
+
+    def find_file(self, folder_id, name):
+        file_id = self.files_by_name.get((folder_id, name))
+        return self.files.get(file_id) if file_id is not None else None
+
+    def take_rate_limit(self, cost=1.0):
+        """
+        Returns the remaining quota after charging ``cost``, or None when rate limiting is off.
+        """
+        if not self.rate_limit:
+            return None
+        capacity, refill = self.rate_limit
+        now = time.monotonic()
+        self.rate_remaining = min(capacity, self.rate_remaining + (now - self.rate_checked_at) * refill)
+        self.rate_checked_at = now
+        if self.rate_remaining < cost:
+            # Rejected requests are not charged, like Canvas.
+            return self.rate_remaining - cost
+        self.rate_remaining -= cost
+        return self.rate_remaining
+
+
+def create_mock_app(**config):
+    """
+    Builds a Flask app that mimics the Canvas endpoints used by the download and upload scripts:
+
+      - GET  /api/v1/files/<id>                (file metadata with a download URL)
+      - GET  /api/v1/folders/<id>              (folder metadata with course context)
+      - GET  /api/v1/courses/<id>/files        (paginated file listing with Link headers)
+      - GET  /api/v1/courses/<id>/folders      (paginated folder listing with Link headers)
+      - POST /api/v1/courses/<id>/files        (upload initiation)
+      - POST /mock_storage/upload/<token>      (storage upload, answers with a 302)
+      - GET  /api/v1/files/<id>/create_success (upload confirmation target of the 302)
+
+    See MockCanvasState for the configuration keywords.
+    """
+    state = MockCanvasState(**config)
+    app = Flask(__name__)
+    app.config["MOCK_STATE"] = state
+    block = _pdf_block()
+
+    def throttle(nbytes, started):
+        if state.bandwidth:
+            expected = nbytes / state.bandwidth
+            elapsed = time.monotonic() - started
+            if expected > elapsed:
+                time.sleep(expected - elapsed)
+
+    @app.before_request
+    def simulate_conditions():
+        if request.path.startswith("/mock/"):
+            return None
+        if state.latency:
+            time.sleep(state.latency)
+        with state.lock:
+            state.stats["requests"] += 1
+            # Only the Canvas API is rate limited; the storage endpoints are not.
+            remaining = state.take_rate_limit() if request.path.startswith("/api/") else None
+            if remaining is not None and remaining < 0:
+                state.stats["throttled"] += 1
+                resp = Response("403 Forbidden (Rate Limit Exceeded)", status=403)
+                resp.headers["X-Rate-Limit-Remaining"] = "0.0"
+                return resp
+            if state.failure_rate and state.random.random() < state.failure_rate:
+                state.stats["failed"] += 1
+                return Response("Injected failure", status=state.failure_status)
+        request.environ["mock.rate_remaining"] = remaining
+        return None
+
+    @app.after_request
+    def add_rate_headers(resp):
+        remaining = request.environ.get("mock.rate_remaining")
+        if remaining is not None:
+            resp.headers.setdefault("X-Rate-Limit-Remaining", f"{max(remaining, 0.0):.1f}")
+            resp.headers.setdefault("X-Request-Cost", "1.0")
+        return resp
+
+    @app.route("/api/v1/files/<int:file_id>", methods=["GET"])
+    def file_metadata(file_id):
+        with state.lock:
+            info = state.files.get(file_id)
+            if not info:
+                return jsonify({"errors": [{"message": "The specified resource does not exist."}]}), 404
+            payload = dict(info)
+        payload["url"] = f"{request.host_url}mock_storage/files/{file_id}/download"
+        return jsonify(payload)
+
+    @app.route("/mock_storage/files/<int:file_id>/download", methods=["GET"])
+    def file_download(file_id):
+        with state.lock:
+            info = state.files.get(file_id)
+        if not info:
+            return "Not found", 404
+        size = info["size"]
+
+        def generate():
+            started = time.monotonic()
+            sent = 0
+            while sent < size:
+                chunk = block[: min(len(block), size - sent)]
+                sent += len(chunk)
+                yield chunk
+                throttle(sent, started)
+            with state.lock:
+                state.stats["downloads"] += 1
+                state.stats["downloaded_bytes"] += sent
+
+        resp = Response(generate(), mimetype="application/pdf")
+        resp.headers["Content-Length"] = str(size)
+        return resp
+
+    @app.route("/api/v1/folders/<int:folder_id>", methods=["GET"])
+    def folder_metadata(folder_id):
+        with state.lock:
+            info = state.folders.get(folder_id)
+        if not info:
+            return jsonify({"errors": [{"message": "The specified resource does not exist."}]}), 404
+        return jsonify(info)
+
+    def paginate(items):
+        try:
+            per_page = max(1, min(int(request.args.get("per_page", 10)), 100))
+            page = max(1, int(request.args.get("page", 1)))
+        except ValueError:
+            return jsonify({"errors": [{"message": "Invalid pagination"}]}), 400
+        start = (page - 1) * per_page
+        resp = jsonify(items[start:start + per_page])
+        links = []
+        base = f"{request.base_url}?per_page={per_page}"
+        if start + per_page < len(items):
+            links.append(f'<{base}&page={page + 1}>; rel="next"')
+        links.append(f'<{base}&page=1>; rel="first"')
+        resp.headers["Link"] = ",".join(links)
+        return resp
+
+    @app.route("/api/v1/courses/<int:course_id>/files", methods=["GET"])
+    def list_course_files(course_id):
+        with state.lock:
+            folder_ids = {f["id"] for f in state.folders.values() if f["context_id"] == course_id}
+            items = [dict(info) for info in state.files.values() if info["folder_id"] in folder_ids]
+        for info in items:
+            info["url"] = f"{request.host_url}mock_storage/files/{info['id']}/download"
+        return paginate(items)
+
+    @app.route("/api/v1/courses/<int:course_id>/folders", methods=["GET"])
+    def list_course_folders(course_id):
+        with state.lock:
+            items = [dict(f) for f in state.folders.values() if f["context_id"] == course_id]
+        return paginate(items)
+
+    @app.route("/api/v1/courses/<int:course_id>/files", methods=["POST"])
+    def initiate_upload(course_id):
+        name = request.form.get("name")
+        try:
+            folder_id = int(request.form.get("parent_folder_id", ""))
+        except ValueError:
+            return jsonify({"errors": [{"message": "parent_folder_id is required"}]}), 400
+        token = uuid.uuid4().hex
+        with state.lock:
+            folder = state.folders.get(folder_id)
+            if not folder or folder["context_id"] != course_id:
+                return jsonify({"errors": [{"message": "Folder not found in course"}]}), 404
+            state.pending_uploads[token] = {"name": name, "folder_id": folder_id}
+        return jsonify({
+            "upload_url": f"{request.host_url}mock_storage/upload/{token}",
+            "upload_params": {"filename": name, "content_type": request.form.get("content_type", "")},
+        })
+
+    @app.route("/mock_storage/upload/<token>", methods=["POST"])
+    def storage_upload(token):
+        started = time.monotonic()
+        received = 0
+        while True:
+            chunk = request.stream.read(STREAM_BLOCK_SIZE)
+            if not chunk:
+                break
+            received += len(chunk)
+            throttle(received, started)
+
+        with state.lock:
+            pending = state.pending_uploads.pop(token, None)
+            if not pending:
+                return "Unknown upload token", 400
+            info = state.find_file(pending["folder_id"], pending["name"])
+            if not info:
+                file_id = max(state.files, default=0) + 1
+                info = {
+                    "id": file_id,
+                    "display_name": pending["name"],
+                    "filename": pending["name"],
+                    "content-type": "application/pdf",
+                    "folder_id": pending["folder_id"],
+                }
+                state.files[file_id] = info
+                state.files_by_name[(pending["folder_id"], pending["name"])] = file_id
+            # The multipart envelope is a few hundred bytes; close enough for a mock.
+            info["size"] = received
+            info["updated_at"] = _now_iso()
+            state.stats["uploads"] += 1
+            state.stats["uploaded_bytes"] += received
+            file_id = info["id"]
+
+        resp = Response("", status=302)
+        resp.headers["Location"] = f"{request.host_url}api/v1/files/{file_id}/create_success?uuid={token}"
+        return resp
+
+    @app.route("/api/v1/files/<int:file_id>/create_success", methods=["GET", "POST"])
+    def confirm_upload(file_id):
+        with state.lock:
+            info = state.files.get(file_id)
+            if not info:
+                return "Not found", 404
+            # Storage POSTs whose confirm step failed aren't counted here.
+            state.stats["confirmed_uploads"] += 1
+            state.stats["confirmed_bytes"] += info.get("size", 0)
+            return jsonify(dict(info))
+
+    @app.route("/mock/stats", methods=["GET"])
+    def mock_stats():
+        with state.lock:
+            return jsonify(dict(state.stats))
+
+    return app
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def start_mock_server(host=DEFAULT_HOST, port=0, quiet=True, **config):
+    """
+    Starts the mock server on a background thread. Pass port=0 to pick a free port.
+    Returns (server, base_url); call server.shutdown() when finished.
+    """
+    app = create_mock_app(**config)
+    handler = QuietRequestHandler if quiet else WSGIRequestHandler
+    server = make_server(host, port, app, threaded=True, request_handler=handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local stand-in for the Canvas file APIs.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--files", type=int, default=DEFAULT_FILE_COUNT, help="Number of files to serve")
+    parser.add_argument("--file-size", type=int, default=DEFAULT_FILE_SIZE, help="Size of each file in bytes")
+    parser.add_argument("--courses", type=int, default=DEFAULT_COURSE_COUNT)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every request")
+    parser.add_argument("--bandwidth", type=float, default=None, help="Transfer cap per request in bytes/sec")
+    parser.add_argument("--rate-limit", type=float, nargs=2, metavar=("CAPACITY", "REFILL"), default=None,
+                        help="Canvas-style rate limit bucket size and refill per second")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Probability of an injected failure")
+    parser.add_argument("--failure-status", type=int, default=503)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    app = create_mock_app(
+        file_count=args.files,
+        file_size=args.file_size,
+        course_count=args.courses,
+        latency=args.latency,
+        bandwidth=args.bandwidth,
+        rate_limit=tuple(args.rate_limit) if args.rate_limit else None,
+        failure_rate=args.failure_rate,
+        failure_status=args.failure_status,
+        seed=args.seed,
+    )
+    print(f"Mock Canvas server on http://{args.host}:{args.port}")
+    app.run(host=args.host, port=args.port, threaded=True, debug=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+import os
+import re
+
+# ========== Name Normalization ==========
+#
+# Abbyy's hot folder doesn't always hand back the exact name we downloaded: depending on the
+# task settings it appends a suffix ("_OCR", "-ocr"), Windows may add " (1)" on a collision,
+# case can change, and download names went through sanitize_filename. Rows are matched on
+# the exact name first and only fall back to normalized keys. Suffixes are only stripped from
+# output names, never from CSV names, so "Reading (1).pdf" in the CSV can't match another
+# row's "Reading.pdf"; and an output whose exact name is another CSV row's is never a variant.
+
+PDF_EXTENSION = ".pdf"
+_FORBIDDEN_CHARS = re.compile(r'[\\/*?:"<>|]')
+_VARIANT_SUFFIX = re.compile(r"(?:[\s_\-.]+(?:ocr|ocred)|\s*\(\d+\))$", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _stem(name):
+    stem = _FORBIDDEN_CHARS.sub("", str(name)).strip()
+    if stem.lower().endswith(PDF_EXTENSION):
+        stem = stem[:-len(PDF_EXTENSION)]
+    return stem
+
+
+def _fold(stem):
+    return _WHITESPACE.sub(" ", stem).strip().casefold()
+
+
+def normalize_name(name):
+    """
+    Returns the key a CSV name is matched on (case, whitespace and forbidden characters only).
+    """
+    return _fold(_stem(name))
+
+
+def output_keys(name):
+    """
+    Returns the keys an Abbyy output name answers to: its own normalized name and the name with
+    each added suffix stripped in turn ("Reading_OCR (1)" -> "reading_ocr (1)", "reading_ocr", "reading").
+    """
+    stem = _stem(name)
+    keys = [_fold(stem)]
+    while True:
+        stripped = _VARIANT_SUFFIX.sub("", stem)
+        if stripped == stem or not stripped.strip():
+            break
+        stem = stripped
+        keys.append(_fold(stem))
+    return tuple(dict.fromkeys(keys))
+
+
+class OcrFolderIndex:
+    """
+    In-memory index of the PDFs under an OCR output folder (including shard subfolders).
+
+    The folder is read once with os.scandir; ``resolve`` then answers each CSV row from memory.
+    ``refresh`` rescans only the directories whose mtime changed, so the same index can be kept
+    across watch-mode passes over a folder Abbyy is still writing to.
+
+    ``csv_names`` are the names of every row being matched; an output whose exact name is one
+    of them belongs to that row and is never handed to another row as a variant.
+    """
+
+    def __init__(self, root, csv_names=None):
+        self.root = root
+        self.csv_names = set(csv_names or ())
+        self.exact = {}        # (subdir, name) -> path
+        self.variants = {}     # (subdir, output key) -> [paths]
+        self.dir_entries = {}  # subdir -> [(name, output keys)]
+        self.dir_mtimes = {}   # subdir -> mtime_ns when last scanned
+        self.variant_matches = 0
+        self.refresh()
+
+    def __len__(self):
+        return len(self.exact)
+
+    def refresh(self):
+        """
+        Rescans new or changed directories. Returns the number of directories read.
+        """
+        scanned = 0
+        pending = [""]
+        seen = set()
+        while pending:
+            subdir = pending.pop()
+            seen.add(subdir)
+            path = os.path.join(self.root, subdir)
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                continue
+            if self.dir_mtimes.get(subdir) == mtime:
+                # Unchanged directory: its files are current, but its subfolders may not be.
+                pending.extend(d for d in self.dir_mtimes if os.path.dirname(d) == subdir and d)
+                continue
+            pending.extend(self._scan(subdir, path))
+            self.dir_mtimes[subdir] = mtime
+            scanned += 1
+        for subdir in set(self.dir_mtimes) - seen:
+            self._forget(subdir)
+            del self.dir_mtimes[subdir]
+        return scanned
+
+    def _scan(self, subdir, path):
+        self._forget(subdir)
+        entries = []
+        children = []
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    if entry.is_dir():
+                        children.append(os.path.join(subdir, entry.name) if subdir else entry.name)
+                    elif entry.name.lower().endswith(PDF_EXTENSION):
+                        keys = output_keys(entry.name)
+                        self.exact[(subdir, entry.name)] = entry.path
+                        for key in keys:
+                            self.variants.setdefault((subdir, key), []).append(entry.path)
+                        entries.append((entry.name, keys))
+        except OSError as e:
+            print(f"[OcrFolderIndex] Could not read {path}: {e}")
+        self.dir_entries[subdir] = entries
+        return children
+
+    def _forget(self, subdir):
+        for name, keys in self.dir_entries.pop(subdir, []):
+            self.exact.pop((subdir, name), None)
+            for key in keys:
+                paths = self.variants.get((subdir, key))
+                if paths:
+                    paths[:] = [p for p in paths if os.path.basename(p) != name]
+                    if not paths:
+                        del self.variants[(subdir, key)]
+
+    def resolve(self, name, subdir=""):
+        """
+        Returns the path of the OCRed PDF for ``name``, or None. Looks in ``subdir`` first and
+        then at the top of the folder, matching the exact name before any variant. A variant
+        only matches when it is unambiguous within that folder and its name isn't a CSV name.
+        """
+        if not isinstance(name, str) or not name:
+            return None
+        folders = [subdir, ""] if subdir else [""]
+        for folder in folders:
+            path = self.exact.get((folder, name))
+            if path:
+                return path
+        key = normalize_name(name)
+        for folder in folders:
+            paths = [p for p in self.variants.get((folder, key), []) if os.path.basename(p) not in self.csv_names]
+            if len(paths) == 1:
+                self.variant_matches += 1
+                return paths[0]
+        return None
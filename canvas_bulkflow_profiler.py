@@ -0,0 +1,234 @@
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+# ========== Job Profiling ==========
+#
+# A profiled job writes its reports to a folder of its own:
+#
+#   cpu.pstats          cProfile data for the whole job (open with `python -m pstats` or snakeviz)
+#   cpu_summary.txt     the top functions by cumulative and by own time
+#   memory_NNN.txt      tracemalloc top allocations at intervals, with growth since the start
+#   memory_final.txt    the same at the end of the job
+#
+# Before Python 3.12, cProfile only sees the thread that enabled it, so the job thread is
+# profiled as a whole and each transfer worker is profiled around the calls passed to
+# ``call()``. Short calls from other threads, such as web requests, share one profile through
+# ``call_serialized()``. All of them are merged into cpu.pstats at the end.
+#
+# From 3.12 cProfile runs on sys.monitoring, which sees every thread but allows only one active
+# profiler per process. The job's own profile covers everything, ``call()`` and
+# ``call_serialized()`` just run the function, and a second profiled job in the same process
+# (another web job) gets memory reports only.
+
+DEFAULT_PROFILE_FOLDER_NAME = "profiles"
+DEFAULT_MEMORY_INTERVAL = 60
+DEFAULT_TOP_ENTRIES = 30
+# Interval snapshots kept on disk (the first one is always kept as the baseline).
+MAX_MEMORY_SNAPSHOTS = 20
+PER_THREAD_PROFILES = sys.version_info < (3, 12)
+_IGNORED_FRAMES = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+# tracemalloc is process-wide; it stays on while any profiled job is running.
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_users = 0
+
+
+def _start_tracemalloc():
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        _tracemalloc_users += 1
+
+
+def _stop_tracemalloc():
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0:
+            tracemalloc.stop()
+
+
+def default_profile_folder(download_folder):
+    """
+    Profiles folder next to the download (hot) folder, so Abbyy never picks up the reports.
+    """
+    parent = os.path.dirname(os.path.abspath(download_folder))
+    return os.path.join(parent, DEFAULT_PROFILE_FOLDER_NAME)
+
+
+class JobProfiler:
+    """
+    CPU and memory profiler for one job, used as a context manager around the job::
+
+        with JobProfiler(folder, "download") as profiler:
+            run_download(..., profiler=profiler)
+    """
+
+    def __init__(self, folder, label, memory_interval=DEFAULT_MEMORY_INTERVAL, top=DEFAULT_TOP_ENTRIES):
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        self.folder = os.path.join(folder, f"{label}-{stamp}")
+        self.memory_interval = memory_interval
+        self.top = top
+        self.lock = threading.Lock()
+        self.profiles = []
+        self.local = threading.local()
+        self.shared_profile = None
+        self.owner = None
+        self.baseline = None
+        self.snapshots = []
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.started = None
+        self.cpu_enabled = False
+
+    # ----- CPU -----
+
+    @staticmethod
+    def _enable(profile):
+        """
+        Starts ``profile``; returns False instead of raising when another profiler is active.
+        """
+        try:
+            profile.enable()
+            return True
+        except (ValueError, RuntimeError) as e:
+            print(f"[Profiler] CPU profiling not available here: {e}")
+            return False
+
+    def _thread_profile(self):
+        profile = getattr(self.local, "profile", None)
+        if profile is None:
+            profile = cProfile.Profile()
+            self.local.profile = profile
+            with self.lock:
+                self.profiles.append(profile)
+        return profile
+
+    def call(self, func, *args, **kwargs):
+        """
+        Runs ``func`` under this thread's profile. The job thread is already profiled.
+        """
+        if not PER_THREAD_PROFILES or threading.get_ident() == self.owner or self.thread is None:
+            return func(*args, **kwargs)
+        profile = self._thread_profile()
+        if not self._enable(profile):
+            return func(*args, **kwargs)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.disable()
+
+    def call_serialized(self, func, *args, **kwargs):
+        """
+        Runs ``func`` under a profile shared by short-lived threads, one call at a time.
+        """
+        if not PER_THREAD_PROFILES or self.thread is None:
+            return func(*args, **kwargs)
+        with self.lock:
+            if self.shared_profile is None:
+                self.shared_profile = cProfile.Profile()
+                self.profiles.append(self.shared_profile)
+            if not self._enable(self.shared_profile):
+                return func(*args, **kwargs)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.shared_profile.disable()
+
+    # ----- Memory -----
+
+    def _snapshot(self, name):
+        snapshot = tracemalloc.take_snapshot().filter_traces(_IGNORED_FRAMES)
+        current, peak = tracemalloc.get_traced_memory()
+        out = io.StringIO()
+        out.write(f"{name} after {time.monotonic() - self.started:.0f}s: "
+                  f"{current / 2 ** 20:.1f} MB traced, peak {peak / 2 ** 20:.1f} MB\n\n")
+        out.write(f"Top {self.top} allocations by line:\n")
+        for stat in snapshot.statistics("lineno")[:self.top]:
+            out.write(f"  {stat}\n")
+        if self.baseline is not None:
+            out.write(f"\nTop {self.top} changes since the start:\n")
+            for stat in snapshot.compare_to(self.baseline, "lineno")[:self.top]:
+                out.write(f"  {stat}\n")
+        else:
+            self.baseline = snapshot
+        path = os.path.join(self.folder, f"{name}.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(out.getvalue())
+        return path
+
+    def _sample_memory(self):
+        count = 0
+        while not self.stop_event.wait(self.memory_interval):
+            count += 1
+            self.snapshots.append(self._snapshot(f"memory_{count:03d}"))
+            if len(self.snapshots) > MAX_MEMORY_SNAPSHOTS:
+                os.remove(self.snapshots.pop(1))
+
+    # ----- Job -----
+
+    def __enter__(self):
+        os.makedirs(self.folder, exist_ok=True)
+        self.started = time.monotonic()
+        _start_tracemalloc()
+        self.snapshots.append(self._snapshot("memory_000"))
+        self.owner = threading.get_ident()
+        self.local.profile = cProfile.Profile()
+        self.profiles.append(self.local.profile)
+        self.thread = threading.Thread(target=self._sample_memory, name="profiler-memory", daemon=True)
+        self.thread.start()
+        self.cpu_enabled = self._enable(self.local.profile)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.cpu_enabled:
+            self.local.profile.disable()
+        self.stop_event.set()
+        self.thread.join()
+        self.thread = None
+        try:
+            self._snapshot("memory_final")
+        finally:
+            _stop_tracemalloc()
+        self._write_cpu_reports()
+        print(f"[Profiler] Wrote CPU and memory reports to {self.folder}")
+        return False
+
+    def _write_cpu_reports(self):
+        with self.lock:
+            profiles = [p for p in self.profiles if p.getstats()]
+        if not profiles:
+            return
+        out = io.StringIO()
+        stats = pstats.Stats(profiles[0], stream=out)
+        for profile in profiles[1:]:
+            stats.add(profile)
+        stats.dump_stats(os.path.join(self.folder, "cpu.pstats"))
+        threads = f"{len(profiles)} threads profiled" if PER_THREAD_PROFILES else "All threads profiled"
+        out.write(f"{threads}.\n\n=== By cumulative time ===\n")
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.top)
+        out.write("\n=== By own time ===\n")
+        stats.sort_stats(pstats.SortKey.TIME).print_stats(self.top)
+        with open(os.path.join(self.folder, "cpu_summary.txt"), "w", encoding="utf-8") as f:
+            f.write(out.getvalue())
+
+    def files(self):
+        """
+        Names of the report files written so far.
+        """
+        if not os.path.isdir(self.folder):
+            return []
+        return sorted(name for name in os.listdir(self.folder) if not name.startswith("."))
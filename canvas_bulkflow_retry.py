@@ -0,0 +1,228 @@
+import csv
+import heapq
+import itertools
+import math
+import random
+import threading
+import time
+
+import requests
+
+# ========== Retry Policies ==========
+
+THROTTLE = "throttle"
+SERVER_ERROR = "server_error"
+TIMEOUT = "timeout"
+CONNECTION = "connection"
+STALLED = "stalled"
+PERMANENT = "permanent"
+
+FAILURE_CLASS_COLUMN = "Failure class"
+FAILURE_REASON_COLUMN = "Failure reason"
+FAILURE_ATTEMPTS_COLUMN = "Attempts"
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with jitter: the n-th retry waits between half and all of
+    ``base_delay * 2 ** (n - 1)`` seconds, capped at ``max_delay``.
+    """
+
+    def __init__(self, max_attempts, base_delay, max_delay):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt, rng=random):
+        ceiling = min(self.max_delay, self.base_delay * (2 ** max(attempt - 1, 0)))
+        return ceiling / 2 + rng.uniform(0, ceiling / 2)
+
+
+DEFAULT_RETRY_POLICIES = {
+    # Canvas throttling clears slowly, so wait longer but keep trying.
+    THROTTLE: RetryPolicy(max_attempts=6, base_delay=15, max_delay=300),
+    SERVER_ERROR: RetryPolicy(max_attempts=4, base_delay=10, max_delay=120),
+    TIMEOUT: RetryPolicy(max_attempts=3, base_delay=10, max_delay=120),
+    CONNECTION: RetryPolicy(max_attempts=3, base_delay=5, max_delay=60),
+    # Aborted by the watchdog; a fresh connection usually lands on a healthier storage node.
+    STALLED: RetryPolicy(max_attempts=3, base_delay=5, max_delay=60),
+}
+
+
+class TransientTransferError(Exception):
+    """
+    Raised by per-file steps when a failure is worth retrying later.
+    """
+
+    def __init__(self, error_class, message, retry_after=None):
+        super().__init__(message)
+        self.error_class = error_class
+        self.retry_after = retry_after
+
+
+def classify_status(status_code, body=""):
+    """
+    Returns the retry class for an HTTP status, or None when retrying won't help.
+    Canvas answers throttled requests with 403 "Rate Limit Exceeded" rather than 429.
+    """
+    if status_code == 429:
+        return THROTTLE
+    if status_code == 403 and "rate limit" in (body or "").lower():
+        return THROTTLE
+    if 500 <= status_code <= 599:
+        return SERVER_ERROR
+    return None
+
+
+def classify_exception(exc):
+    if isinstance(exc, requests.Timeout):
+        return TIMEOUT
+    if isinstance(exc, (requests.ConnectionError, requests.exceptions.ChunkedEncodingError)):
+        return CONNECTION
+    return None
+
+
+def retry_after_seconds(resp):
+    value = resp.headers.get("Retry-After") if resp is not None else None
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+def raise_for_transient_status(resp, what):
+    """
+    Raises TransientTransferError when ``resp`` failed with a retryable status.
+    """
+    error_class = classify_status(resp.status_code, resp.text)
+    if error_class:
+        raise TransientTransferError(
+            error_class,
+            f"{what} failed (Status: {resp.status_code}).",
+            retry_after=retry_after_seconds(resp),
+        )
+
+
+def raise_for_transient_exception(exc, what):
+    """
+    Re-raises a requests exception as TransientTransferError when it is retryable.
+    """
+    error_class = classify_exception(exc)
+    if error_class:
+        raise TransientTransferError(error_class, f"{what} failed: {exc}.") from exc
+
+
+# ========== Deferred Retry Queue ==========
+
+class RetryQueue:
+    """
+    Holds failed items until their backoff expires so healthy files are not blocked.
+
+    Items are retried by ``drain`` after the main pass. Anything that runs out of attempts,
+    or fails with a non-retryable error, ends up in ``failures`` for the final report.
+    """
+
+    def __init__(self, policies=None, rng=None):
+        self.policies = dict(DEFAULT_RETRY_POLICIES)
+        if policies:
+            self.policies.update(policies)
+        self.rng = rng or random.Random()
+        self._heap = []
+        self._counter = itertools.count()
+        self._attempts = {}
+        self.failures = []
+        self.retried = 0
+        self.recovered = 0
+        self.exhausted = 0
+        # defer() and fail() may be called from several transfer threads.
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def defer(self, key, item, row, error):
+        """
+        Schedules ``item`` for another attempt after ``error`` (a TransientTransferError).
+        Returns False, and records a permanent failure, once the policy gives up.
+        """
+        with self.lock:
+            attempts = self._attempts.get(key, 0) + 1
+            self._attempts[key] = attempts
+            policy = self.policies.get(error.error_class)
+            if not policy or attempts >= policy.max_attempts:
+                self.exhausted += 1
+                self.fail(key, row, str(error), error.error_class)
+                return False
+
+            delay = policy.delay(attempts, self.rng)
+            if error.retry_after:
+                delay = max(delay, error.retry_after)
+            heapq.heappush(self._heap, (time.monotonic() + delay, next(self._counter), key, item, row))
+            return True
+
+    def fail(self, key, row, reason, error_class=PERMANENT):
+        with self.lock:
+            self.failures.append({
+                "row": dict(row),
+                "error_class": error_class,
+                "reason": reason,
+                "attempts": self._attempts.get(key, 0) + (1 if error_class == PERMANENT else 0),
+            })
+
+    def drain(self, process, label="item"):
+        """
+        Retries deferred items in backoff order. ``process(item)`` is the same per-item
+        function used in the main pass: it returns True on success and raises
+        TransientTransferError to be deferred again.
+        """
+        while self._heap:
+            ready_at, _, key, item, row = heapq.heappop(self._heap)
+            wait = ready_at - time.monotonic()
+            if wait > 0:
+                print(f"[Retry] Waiting {wait:.0f}s before retrying {label} {key}...")
+                time.sleep(wait)
+            self.retried += 1
+            try:
+                if process(item):
+                    self.recovered += 1
+            except TransientTransferError as e:
+                if self.defer(key, item, row, e):
+                    print(f"[Retry] {label} {key}: {e} Retrying later.")
+                else:
+                    print(f"[Retry] {label} {key}: {e} Giving up.")
+
+    def print_summary(self):
+        if self.retried:
+            print(f"Retried {self.retried} deferred attempts; {self.recovered} recovered.")
+        if self.failures:
+            print(f"Permanently failed: {len(self.failures)} files.")
+            for failure in self.failures:
+                print(f"  - [{failure['error_class']}] {failure['reason']}")
+
+    def write_failures_csv(self, path):
+        """
+        Writes permanently failed rows, with their original columns, so the file can be fed
+        straight back in for a targeted rerun. Returns the number of rows written.
+        """
+        if not self.failures:
+            return 0
+        columns = []
+        for failure in self.failures:
+            for column in failure["row"]:
+                if column not in columns:
+                    columns.append(column)
+        columns += [FAILURE_CLASS_COLUMN, FAILURE_REASON_COLUMN, FAILURE_ATTEMPTS_COLUMN]
+
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=columns)
+            writer.writeheader()
+            for failure in self.failures:
+                record = {
+                    column: "" if isinstance(value, float) and math.isnan(value) else value
+                    for column, value in failure["row"].items()
+                }
+                record[FAILURE_CLASS_COLUMN] = failure["error_class"]
+                record[FAILURE_REASON_COLUMN] = failure["reason"]
+                record[FAILURE_ATTEMPTS_COLUMN] = failure["attempts"]
+                writer.writerow(record)
+        return len(self.failures)
@@ -0,0 +1,124 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# ========== Work Ordering ==========
+#
+# "csv"            - CSV order (original behaviour)
+# "largest-first"  - biggest files start first, so no worker is left finishing a huge scanned
+#                    textbook alone at the end (shortest total run time with several workers)
+# "smallest-first" - many small files finish early, for quick visible progress
+#
+# Rows without a known size keep their CSV order and run after the sized ones.
+
+ORDER_CSV = "csv"
+ORDER_LARGEST_FIRST = "largest-first"
+ORDER_SMALLEST_FIRST = "smallest-first"
+ORDERS = (ORDER_CSV, ORDER_LARGEST_FIRST, ORDER_SMALLEST_FIRST)
+DEFAULT_ORDER = ORDER_CSV
+DEFAULT_WORKERS = 1
+MAX_WORKERS = 16
+# Items handed to the pool ahead of the workers, per worker; the rest wait in the caller's list.
+QUEUED_PER_WORKER = 2
+
+
+def order_work(items, sizes, order=DEFAULT_ORDER):
+    """
+    Returns ``items`` reordered by ``sizes`` (a parallel list; None = unknown).
+    """
+    if order == ORDER_CSV:
+        return list(items)
+    if order not in ORDERS:
+        raise ValueError(f"Unknown work order '{order}'. Expected one of: {', '.join(ORDERS)}")
+    known = [(size, i) for i, size in enumerate(sizes) if size is not None]
+    unknown = [i for i, size in enumerate(sizes) if size is None]
+    # sort() is stable, so equal sizes keep CSV order.
+    known.sort(key=lambda pair: pair[0], reverse=order == ORDER_LARGEST_FIRST)
+    if unknown and known:
+        print(f"[Scheduler] {len(unknown)} rows have no known size; they run after the other {len(known)}.")
+    return [items[i] for _, i in known] + [items[i] for i in unknown]
+
+
+# ========== Worker Pool ==========
+
+class WorkRunner:
+    """
+    Runs ``process(item)`` for every item on ``workers`` threads (inline when workers is 1)
+    and measures how busy the workers were.
+
+    ``process`` is expected to handle its own per-item errors; anything it raises stops the
+    run, as it would in a plain loop: items not started yet are dropped, the ones in flight
+    finish, and the first error is re-raised. Only a few items per worker are queued at a time.
+    With a JobProfiler, worker threads are profiled too.
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, profiler=None):
+        self.workers = max(1, min(int(workers or 1), MAX_WORKERS))
+        self.profiler = profiler
+        self.busy_seconds = 0.0
+        self.wall_seconds = 0.0
+        self.items_run = 0
+        self.lock = threading.Lock()
+
+    def _timed(self, process, item):
+        started = time.perf_counter()
+        try:
+            if self.profiler:
+                return self.profiler.call(process, item)
+            return process(item)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self.lock:
+                self.busy_seconds += elapsed
+                self.items_run += 1
+
+    def run(self, items, process):
+        started = time.perf_counter()
+        try:
+            if self.workers == 1:
+                for item in items:
+                    self._timed(process, item)
+                return
+            self._run_pool(items, process)
+        finally:
+            self.wall_seconds += time.perf_counter() - started
+
+    def _run_pool(self, items, process):
+        pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="transfer")
+        slots = threading.BoundedSemaphore(self.workers * QUEUED_PER_WORKER)
+        # Reentrant: a future that is already done runs its callback inside add_done_callback.
+        submit_lock = threading.RLock()
+        errors = []
+
+        def finished(future):
+            if not future.cancelled() and future.exception() is not None:
+                with submit_lock:
+                    errors.append(future.exception())
+                    # Drop whatever is still queued; items in flight finish.
+                    pool.shutdown(wait=False, cancel_futures=True)
+            slots.release()
+
+        try:
+            for item in items:
+                slots.acquire()
+                with submit_lock:
+                    if errors:
+                        break
+                    pool.submit(self._timed, process, item).add_done_callback(finished)
+        except BaseException:
+            pool.shutdown(wait=True, cancel_futures=True)
+            raise
+        pool.shutdown(wait=True)
+        if errors:
+            raise errors[0]
+
+    @property
+    def utilization(self):
+        capacity = self.workers * self.wall_seconds
+        return self.busy_seconds / capacity if capacity else 0.0
+
+    def print_summary(self):
+        if not self.items_run:
+            return
+        print(f"Worker utilization: {self.utilization:.0%} ({self.workers} workers busy "
+              f"{self.busy_seconds:.0f}s of {self.wall_seconds:.0f}s, {self.items_run} files)")
@@ -0,0 +1,66 @@
+import argparse
+import hashlib
+
+import pandas as pd
+
+# ========== Machine Sharding ==========
+#
+# "--shard i/n" splits one CSV across n machines without any coordination: every machine
+# reads the full CSV and keeps only the rows that hash to its shard. The hash is md5 of the
+# file id (Python's own hash() is salted per process, so it can't be used across machines).
+#
+# Download keys rows whose name appears more than once by that name instead, so a whole
+# duplicate group lands on one machine and is skipped and reported there once. Upload only
+# uses file ids: duplicate-name rows are never downloaded, so there is nothing to upload.
+
+
+def parse_shard(text):
+    """
+    Parses "i/n" (1-based) into (i, n). Raises argparse.ArgumentTypeError when invalid.
+    """
+    try:
+        index, count = (int(part) for part in str(text).split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Shard must look like 2/4, got '{text}'.")
+    if count < 1 or not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(f"Shard {text} is out of range; use 1/N through N/N.")
+    return index, count
+
+
+def format_shard(shard):
+    return f"{shard[0]}/{shard[1]}"
+
+
+def _file_id_key(file_id):
+    try:
+        return str(int(float(file_id)))
+    except (TypeError, ValueError):
+        return ""
+
+
+def shard_index(key, count):
+    """
+    Returns the 1-based shard a key belongs to.
+    """
+    digest = hashlib.md5(key.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % count + 1
+
+
+def shard_mask(df, shard, file_id_column, filename_column=None, duplicate_names=None):
+    """
+    Boolean Series selecting the rows of ``df`` that belong to ``shard`` (an (i, n) tuple).
+    """
+    index, count = shard
+    if count == 1:
+        return pd.Series(True, index=df.index)
+    duplicate_names = duplicate_names or set()
+    keys = []
+    for file_id, name in zip(
+        df[file_id_column],
+        df[filename_column] if filename_column else [None] * len(df),
+    ):
+        if name in duplicate_names:
+            keys.append("name:" + str(name))
+        else:
+            keys.append(_file_id_key(file_id))
+    return pd.Series([shard_index(key, count) == index for key in keys], index=df.index)
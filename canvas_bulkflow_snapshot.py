@@ -0,0 +1,152 @@
+import argparse
+import csv
+import hashlib
+import os
+
+import pandas as pd
+
+# ========== Report Snapshots ==========
+#
+# The weekly Ally report lists every scanned PDF in the institution, most of them handled in
+# earlier weeks. An incremental run compares the report with a snapshot saved by the previous
+# run: one row per file id with a fingerprint of the columns that matter and how that run
+# went. Only rows that are new, changed, or not finished last time are processed; the rest
+# are carried over. The snapshot is rewritten at the end of each run (never mid-run, so an
+# interrupted run is simply redone).
+#
+# Rows skipped for a duplicate name are finished too, but the size of their name group is part
+# of the fingerprint, so a group that stops (or starts) being duplicated counts as changed.
+
+DEFAULT_SNAPSHOT_FILENAME = "report_snapshot.csv"
+DEFAULT_CHANGES_FILENAME = "report_changes.csv"
+# Columns whose change means the file should be handled again (those present are used).
+DEFAULT_DIFF_COLUMNS = ["Name", "Mime type", "Scanned:1", "Course id", "Url", "Deleted at", "Size"]
+SNAPSHOT_COLUMNS = ["Id", "Fingerprint", "Status"]
+STATUS_DONE = "done"
+STATUS_DUPLICATE = "duplicate"
+# Statuses that don't need another attempt while the row is unchanged.
+FINAL_STATUSES = (STATUS_DONE, STATUS_DUPLICATE)
+_SEPARATOR = "\x1f"
+
+
+def _key(file_id):
+    try:
+        return str(int(float(file_id)))
+    except (TypeError, ValueError):
+        return None
+
+
+def _text(value):
+    if value is None or (isinstance(value, float) and value != value):
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        # "12.0" and "12" are the same id; pandas reads a column with blanks as floats.
+        return str(int(value))
+    return str(value)
+
+
+def row_fingerprints(df, columns, name_column=None):
+    """
+    md5 of each row's values in ``columns`` (stable across runs, unlike pandas' hashing).
+    With ``name_column``, rows whose name is shared by other rows also include the group size.
+    """
+    values = [df[column].tolist() for column in columns]
+    rows = [_SEPARATOR.join(_text(v) for v in row) for row in zip(*values)] if values else [None] * len(df)
+    if name_column and name_column in df.columns:
+        group_sizes = df[name_column].map(df[name_column].value_counts()).tolist()
+        # Unique names add nothing, so their fingerprints match snapshots saved before this.
+        rows = [
+            f"{row or ''}{_SEPARATOR}duplicates={int(size)}" if size == size and size > 1 else row
+            for row, size in zip(rows, group_sizes)
+        ]
+    return [hashlib.md5(row.encode("utf-8")).hexdigest() if row is not None else "" for row in rows]
+
+
+class ReportSnapshot:
+    """
+    The previous run's view of the report, keyed by file id.
+    """
+
+    def __init__(self, path, diff_columns=None):
+        self.path = path
+        self.diff_columns = diff_columns or DEFAULT_DIFF_COLUMNS
+        self.previous = {}  # file id -> (fingerprint, status)
+        self.current = {}   # file id -> fingerprint, for the rows of this run's report
+        if os.path.exists(path):
+            with open(path, newline="", encoding="utf-8") as f:
+                for record in csv.DictReader(f):
+                    self.previous[record["Id"]] = (record["Fingerprint"], record["Status"])
+
+    def __len__(self):
+        return len(self.previous)
+
+    def select(self, df, file_id_column, name_column=None):
+        """
+        Returns the rows of ``df`` that are new, changed or were not finished last time.
+        ``name_column`` adds each row's duplicate-name group size to its fingerprint.
+        """
+        columns = [column for column in self.diff_columns if column in df.columns]
+        keys = [_key(file_id) for file_id in df[file_id_column].tolist()]
+        fingerprints = row_fingerprints(df, columns, name_column)
+        counts = {"new": 0, "changed": 0, "retry": 0, "unchanged": 0}
+        keep = []
+        for key, fingerprint in zip(keys, fingerprints):
+            if key is None:
+                keep.append(True)
+                continue
+            self.current[key] = fingerprint
+            previous = self.previous.get(key)
+            if previous is None:
+                counts["new"] += 1
+            elif previous[0] != fingerprint:
+                counts["changed"] += 1
+            elif previous[1] not in FINAL_STATUSES:
+                counts["retry"] += 1
+            else:
+                counts["unchanged"] += 1
+                keep.append(False)
+                continue
+            keep.append(True)
+        print(f"[Snapshot] {counts['new']} new, {counts['changed']} changed, {counts['retry']} not finished "
+              f"last time, {counts['unchanged']} unchanged (skipped). Compared on: {', '.join(columns)}")
+        return df[pd.Series(keep, index=df.index, dtype=bool)]
+
+    def save(self, statuses):
+        """
+        Rewrites the snapshot for this run's report. ``statuses`` maps file ids handled in this
+        run to their outcome; rows that weren't handled keep their previous status.
+        """
+        statuses = {_key(file_id): status for file_id, status in statuses.items()}
+        done = 0
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(SNAPSHOT_COLUMNS)
+            for key, fingerprint in self.current.items():
+                status = statuses.get(key) or self.previous.get(key, ("", ""))[1]
+                done += status == STATUS_DONE
+                writer.writerow([key, fingerprint, status])
+        os.replace(tmp_path, self.path)
+        print(f"[Snapshot] Saved {len(self.current)} rows to {self.path} ({done} done).")
+
+
+# ========== Script Entry Point ==========
+def main():
+    parser = argparse.ArgumentParser(
+        description="List the rows of an Ally report that are new or changed since the last snapshot."
+    )
+    parser.add_argument("--csv", required=True, help="Path to the new Ally CSV file")
+    parser.add_argument("--snapshot", required=True, help="Snapshot saved by the previous incremental run")
+    parser.add_argument("--out", required=True, help="Where to write the selected rows")
+    parser.add_argument("--file-id-column", default="Id")
+    parser.add_argument("--filename-column", default="Name")
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.csv)
+    changes = ReportSnapshot(args.snapshot).select(df, args.file_id_column, args.filename_column)
+    changes.to_csv(args.out, index=False)
+    print(f"Wrote {len(changes)} of {len(df)} rows to {args.out}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+import argparse
+import csv
+import math
+import mmap
+import os
+import re
+import threading
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+from canvas_bulkflow_layout import run_file_path
+
+# ========== Defaults ==========
+
+DEFAULT_HAS_TEXT_FOLDER = "HasText"
+HAS_TEXT_LIST_FILENAME = "has_text_layer.csv"
+HAS_TEXT_LIST_COLUMNS = ["Id", "Name", "Path", "Reason"]
+STAGED_SUFFIX = ".inspect"
+DEFAULT_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))
+
+# Content streams sampled per PDF, spread evenly through the file.
+DEFAULT_SAMPLE_STREAMS = 12
+# A sampled stream counts as text when it shows at least this many characters
+# (a few lines; page numbers and stamps on image-only scans stay well below it).
+MIN_STREAM_TEXT_CHARS = 200
+# Share of the sampled streams that must carry text.
+MIN_TEXT_FRACTION = 0.5
+MAX_INFLATED_BYTES = 8 * 1024 * 1024
+DICT_LOOKBACK = 2048
+
+# ========== PDF Inspection ==========
+#
+# This is deliberately not a PDF parser. It walks the stream objects in file order, skips
+# images, fonts and metadata using their dictionaries (and their /Length, so image data is
+# never searched), inflates a sample of what is left, and counts the characters shown
+# between BT/ET operators. Anything it can't read (encrypted files, unusual filters) is
+# reported as having no text, so the worst case is an unnecessary OCR, never a missed one.
+
+_STREAM_START = re.compile(rb"(?<!end)stream\r?\n")
+_DIRECT_LENGTH = re.compile(rb"/Length\s+(\d+)(?!\s+\d+\s+R)")
+_FILTERS = re.compile(rb"/(\w+Decode)\b")
+_SUBTYPE = re.compile(rb"/Subtype\s*/(\w+)")
+_SKIPPED_TYPES = re.compile(rb"/Type\s*/(?:XRef|Metadata|EmbeddedFile)\b|/Length[123]\b")
+_OBJECT_STREAM = re.compile(rb"/Type\s*/ObjStm\b")
+_TEXT_BLOCK = re.compile(rb"\bBT\b(.*?)\bET\b", re.S)
+_LITERAL_STRING = re.compile(rb"\((?:\\.|[^\\()])*\)", re.S)
+_HEX_STRING = re.compile(rb"<([0-9A-Fa-f\s]*)>")
+
+
+def _stream_dict(data, start):
+    head = data[max(0, start - DICT_LOOKBACK):start]
+    obj = head.rfind(b"obj")
+    return head[obj + 3:] if obj >= 0 else head
+
+
+def _stream_end(data, body_start, stream_dict):
+    match = _DIRECT_LENGTH.search(stream_dict)
+    if match:
+        end = body_start + int(match.group(1))
+        if data.find(b"endstream", end, end + 32) >= 0:
+            return end
+    end = data.find(b"endstream", body_start)
+    return end if end >= 0 else len(data)
+
+
+def _inflate(raw):
+    try:
+        return zlib.decompressobj().decompress(raw, MAX_INFLATED_BYTES)
+    except zlib.error:
+        return None
+
+
+def _shown_characters(content):
+    count = 0
+    for block in _TEXT_BLOCK.finditer(content):
+        text = block.group(1)
+        for literal in _LITERAL_STRING.finditer(text):
+            count += len(literal.group(0)) - 2
+        for hex_string in _HEX_STRING.finditer(text):
+            count += len(re.sub(rb"\s", b"", hex_string.group(1))) // 2
+    return count
+
+
+def inspect_pdf(path, sample_streams=DEFAULT_SAMPLE_STREAMS):
+    """
+    Returns (has_text, reason) for a PDF, judging from a sample of its page content streams
+    and whether it declares any font resources.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return False, "empty file"
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if not data[:1024].lstrip().startswith(b"%PDF"):
+                return False, "not a PDF"
+            if data.find(b"/Encrypt") >= 0:
+                return False, "encrypted"
+
+            has_fonts = data.find(b"/Font") >= 0
+            candidates = []
+            pos = 0
+            while True:
+                match = _STREAM_START.search(data, pos)
+                if not match:
+                    break
+                body_start = match.end()
+                stream_dict = _stream_dict(data, match.start())
+                end = _stream_end(data, body_start, stream_dict)
+                pos = max(end, body_start)
+
+                filters = _FILTERS.findall(stream_dict)
+                if any(name != b"FlateDecode" for name in filters):
+                    continue
+                subtype = _SUBTYPE.search(stream_dict)
+                if (subtype and subtype.group(1) != b"Form") or _SKIPPED_TYPES.search(stream_dict):
+                    continue
+                if _OBJECT_STREAM.search(stream_dict):
+                    # Page and font dictionaries can live inside compressed object streams.
+                    if not has_fonts and filters:
+                        inflated = _inflate(data[body_start:end])
+                        has_fonts = bool(inflated and b"/Font" in inflated)
+                    continue
+                candidates.append((body_start, end, bool(filters)))
+
+    if not has_fonts:
+        return False, "no font resources"
+    if not candidates:
+        return False, "no content streams"
+    return _sample_text(path, candidates, sample_streams)
+
+
+def _sample_text(path, candidates, sample_streams):
+    step = max(1, len(candidates) / sample_streams)
+    picked = [candidates[int(i * step)] for i in range(min(sample_streams, len(candidates)))]
+    text_streams = 0
+    with open(path, "rb") as f:
+        for start, end, compressed in picked:
+            f.seek(start)
+            content = f.read(end - start)
+            if compressed:
+                content = _inflate(content)
+            if content and _shown_characters(content) >= MIN_STREAM_TEXT_CHARS:
+                text_streams += 1
+    needed = max(1, math.ceil(len(picked) * MIN_TEXT_FRACTION))
+    reason = f"text in {text_streams} of {len(picked)} sampled content streams"
+    return text_streams >= needed, reason
+
+
+def _inspect_safely(path):
+    # Runs in a worker process; an unreadable file simply goes on to OCR.
+    try:
+        return inspect_pdf(path)
+    except (OSError, ValueError) as e:
+        return False, f"could not inspect: {e}"
+
+
+# ========== Sorting Downloads ==========
+
+def default_has_text_folder(output_folder):
+    """
+    Has-text folder next to the hot folder, so a hot folder that processes subfolders never OCRs it.
+    """
+    parent = os.path.dirname(os.path.abspath(output_folder))
+    return os.path.join(parent, DEFAULT_HAS_TEXT_FOLDER)
+
+
+def read_has_text_list(path):
+    """
+    Returns (file_ids, names) recorded in a has-text list CSV, or two empty sets.
+
+    Rows are matched by id. Names are only returned for entries written without an id (by
+    ``main()``), since the list grows across runs and a name alone can belong to many files.
+    """
+    file_ids, names = set(), set()
+    if not path or not os.path.exists(path):
+        return file_ids, names
+    with open(path, newline="", encoding="utf-8") as f:
+        for record in csv.DictReader(f):
+            if record.get("Id"):
+                try:
+                    file_ids.add(int(float(record["Id"])))
+                    continue
+                except ValueError:
+                    pass
+            if record.get("Name"):
+                names.add(record["Name"])
+    return file_ids, names
+
+
+class TextLayerSorter:
+    """
+    Inspects freshly downloaded PDFs in a process pool while the download continues.
+
+    Each download is saved under a staged name (``<name>.pdf.inspect``) that the hot folder
+    ignores. Once inspected it is renamed to its real path, or moved to the has-text folder
+    and recorded in the has-text list CSV, which the upload step reads to skip those rows.
+    """
+
+    def __init__(self, has_text_folder, list_path, workers=DEFAULT_WORKERS):
+        self.has_text_folder = has_text_folder
+        self.list_path = list_path
+        self.pool = ProcessPoolExecutor(max_workers=workers)
+        self.pending = []
+        self.has_text = []
+        self.needs_ocr = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def staged_path(final_path):
+        return final_path + STAGED_SUFFIX
+
+    def submit(self, file_id, staged_path, final_path):
+        future = self.pool.submit(_inspect_safely, staged_path)
+        with self.lock:
+            self.pending.append((future, file_id, staged_path, final_path))
+        self.poll()
+
+    def poll(self):
+        """
+        Moves every file whose inspection has finished. Never blocks.
+        """
+        done, still_pending = [], []
+        with self.lock:
+            for job in self.pending:
+                (done if job[0].done() else still_pending).append(job)
+            self.pending = still_pending
+        for job in done:
+            self._finish(*job)
+
+    def _finish(self, future, file_id, staged_path, final_path):
+        try:
+            has_text, reason = future.result()
+        except Exception as e:
+            has_text, reason = False, f"inspection failed: {e}"
+        name = os.path.basename(final_path)
+        if has_text:
+            os.makedirs(self.has_text_folder, exist_ok=True)
+            target = os.path.join(self.has_text_folder, name)
+            os.replace(staged_path, target)
+            with self.lock:
+                self.has_text.append((file_id, name, target, reason))
+            print(f"[TextLayer] {name} already has a text layer ({reason}). Moved to {self.has_text_folder}.")
+        else:
+            os.replace(staged_path, final_path)
+            with self.lock:
+                self.needs_ocr += 1
+
+    def close(self):
+        """
+        Waits for outstanding inspections, writes the has-text list and stops the pool.
+        """
+        with self.lock:
+            pending, self.pending = self.pending, []
+        for job in pending:
+            self._finish(*job)
+        self.pool.shutdown()
+        if self.has_text:
+            self._append_list()
+        print(f"Text layer check: {len(self.has_text)} already had text, {self.needs_ocr} sent to OCR.")
+
+    def _append_list(self):
+        new_file = not os.path.exists(self.list_path)
+        with open(self.list_path, "a", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            if new_file:
+                writer.writerow(HAS_TEXT_LIST_COLUMNS)
+            for file_id, name, target, reason in self.has_text:
+                writer.writerow([int(float(file_id)) if file_id is not None else "", name, target, reason])
+
+
+# ========== Script Entry Point ==========
+def main():
+    parser = argparse.ArgumentParser(
+        description="Move PDFs that already have a text layer out of a download folder."
+    )
+    parser.add_argument("--folder", required=True, help="Folder of downloaded PDFs (top level only)")
+    parser.add_argument("--has-text-folder", default=None,
+                        help=f"Where to move PDFs with text (default: {DEFAULT_HAS_TEXT_FOLDER} next to the folder)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--dry-run", action="store_true", help="Only report, don't move anything")
+    args = parser.parse_args()
+
+    has_text_folder = args.has_text_folder or default_has_text_folder(args.folder)
+    with os.scandir(args.folder) as it:
+        paths = sorted(e.path for e in it if e.is_file() and e.name.lower().endswith(".pdf"))
+
+    if args.dry_run:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            for path, (has_text, reason) in zip(paths, pool.map(_inspect_safely, paths, chunksize=4)):
+                print(f"{'TEXT ' if has_text else 'SCAN '} {os.path.basename(path)}: {reason}")
+        return
+
+    sorter = TextLayerSorter(has_text_folder, run_file_path(args.folder, HAS_TEXT_LIST_FILENAME), args.workers)
+    for path in paths:
+        staged = sorter.staged_path(path)
+        os.replace(path, staged)
+        sorter.submit(None, staged, path)
+    sorter.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+import hashlib
+import http.client
+import io
+import os
+import time
+import uuid
+
+import requests
+from urllib3.exceptions import DecodeError, ProtocolError, ReadTimeoutError
+
+# ========== Defaults ==========
+
+MIN_CHUNK_SIZE = 64 * 1024
+MAX_CHUNK_SIZE = 4 * 1024 * 1024
+INITIAL_CHUNK_SIZE = 256 * 1024
+# Aim for reads that take about this long: big enough to amortize per-call overhead on
+# fast links, small enough that slow links still report progress regularly.
+TARGET_READ_SECONDS = 0.25
+PART_SUFFIX = ".part"
+
+
+def _tune_chunk_size(current, nbytes, elapsed):
+    """
+    Picks the next read size from the throughput of the last read.
+    """
+    if nbytes < current:
+        # Short read: the socket had less buffered than we asked for, so don't grow.
+        return current
+    if elapsed <= 0:
+        return min(current * 2, MAX_CHUNK_SIZE)
+    target = nbytes / elapsed * TARGET_READ_SECONDS
+    if target > current * 2:
+        return min(current * 2, MAX_CHUNK_SIZE)
+    if target < current / 2:
+        return max(current // 2, MIN_CHUNK_SIZE)
+    return current
+
+
+def _preallocate(f, size):
+    """
+    Reserves ``size`` bytes for the file up front so the filesystem can lay it out contiguously.
+    """
+    if hasattr(os, "posix_fallocate"):
+        try:
+            os.posix_fallocate(f.fileno(), 0, size)
+            return
+        except OSError:
+            pass
+    # On Windows, extending the file reserves the clusters (without writing zeros).
+    f.truncate(size)
+    f.seek(0)
+
+
+def _charge(nbytes, limiter, watch):
+    """
+    Charges ``nbytes`` against the bandwidth cap, then reports them to the watch. The watch is
+    paused while the cap makes us wait, so a throttled transfer is never taken for a stalled one.
+    """
+    if limiter:
+        if watch:
+            watch.pause()
+        try:
+            limiter.throttle(nbytes)
+        finally:
+            if watch:
+                watch.resume()
+    if watch:
+        watch.progress(nbytes)
+
+
+def _body_reader(raw):
+    """
+    Returns a ``readinto(buffer)`` for the body of a streamed urllib3 response.
+
+    urllib3's own readinto reads into a new bytes object and copies it over, so a body without
+    Content-Encoding is read through the underlying http.client response instead, which fills
+    the buffer directly. That bypasses urllib3's error wrapping and Content-Length check, so
+    both are redone here. Encoded bodies still go through urllib3, which decodes them.
+    """
+    encoding = raw.headers.get("Content-Encoding", "").strip().lower()
+    fp = getattr(raw, "_fp", None)
+    if encoding not in ("", "identity") or not isinstance(fp, http.client.HTTPResponse):
+        # Let urllib3 undo any Content-Encoding, like iter_content does.
+        raw.decode_content = True
+
+        def readinto(buffer):
+            try:
+                return raw.readinto(buffer)
+            except ReadTimeoutError as e:
+                raise requests.exceptions.ReadTimeout(e) from e
+            except ProtocolError as e:
+                raise requests.exceptions.ChunkedEncodingError(e) from e
+            except DecodeError as e:
+                raise requests.exceptions.ContentDecodingError(e) from e
+
+        return readinto
+
+    def readinto(buffer):
+        try:
+            nbytes = fp.readinto(buffer)
+        except TimeoutError as e:
+            raise requests.exceptions.ReadTimeout(e) from e
+        except (http.client.HTTPException, OSError) as e:
+            raise requests.exceptions.ChunkedEncodingError(e) from e
+        if not nbytes and buffer and fp.length:
+            # http.client returns 0 when the connection drops early; urllib3 would raise.
+            raise requests.exceptions.ChunkedEncodingError(
+                f"Connection closed with {fp.length} bytes of the body still to come."
+            )
+        return nbytes
+
+    return readinto
+
+
+def stream_to_file(resp, filepath, expected_size=None, limiter=None, watch=None):
+    """
+    Writes a streamed requests response to ``filepath`` and returns (bytes_written, sha256_hex).
+
+    The body is read straight into one reusable buffer (see ``_body_reader``) with an adaptive
+    read size, hashed as it is written, and saved under ``filepath + '.part'`` until complete. The part file is
+    preallocated from ``expected_size`` and renamed into place at the end, so nothing watching
+    the folder (Abbyy's hot folder) ever sees a partial or zero-filled PDF.
+
+    Network errors are raised as requests exceptions; the part file is removed on any failure.
+    With a BandwidthLimiter, each read is charged against the shared cap. With a TransferWatch,
+    each read reports progress, and a transfer aborted by the watchdog is never renamed into place.
+    """
+    part_path = filepath + PART_SUFFIX
+    buffer = memoryview(bytearray(MAX_CHUNK_SIZE))
+    digest = hashlib.sha256()
+    chunk_size = INITIAL_CHUNK_SIZE
+    written = 0
+
+    readinto = _body_reader(resp.raw)
+
+    try:
+        with open(part_path, "wb") as f:
+            if expected_size:
+                _preallocate(f, expected_size)
+            while True:
+                started = time.perf_counter()
+                nbytes = readinto(buffer[:chunk_size])
+                if not nbytes:
+                    break
+                chunk = buffer[:nbytes]
+                f.write(chunk)
+                digest.update(chunk)
+                written += nbytes
+                chunk_size = _tune_chunk_size(chunk_size, nbytes, time.perf_counter() - started)
+                _charge(nbytes, limiter, watch)
+            if watch:
+                watch.check()
+            if expected_size and written != expected_size:
+                # Drop any preallocated tail beyond what the server actually sent.
+                f.truncate(written)
+        os.replace(part_path, filepath)
+    except BaseException:
+        try:
+            os.remove(part_path)
+        except OSError:
+            pass
+        raise
+    finally:
+        resp.close()
+
+    return written, digest.hexdigest()
+
+
+class MultipartUploadBody:
+    """
+    A multipart/form-data request body that streams the file from disk.
+
+    requests' ``files=`` builds the whole body in memory before sending; this object reports
+    its length up front (so the request still carries Content-Length) and is read in small
+    blocks while sending, which is also where the BandwidthLimiter and TransferWatch apply.
+    The watch is paused once the last byte has gone out.
+    """
+
+    def __init__(self, fields, file_field, filename, fileobj, file_size, content_type, limiter=None, watch=None):
+        boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={boundary}"
+        head = io.BytesIO()
+        for name, value in fields.items():
+            head.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n'.encode("utf-8"))
+            head.write(f"{value}\r\n".encode("utf-8"))
+        safe_filename = str(filename).replace('"', "%22")
+        head.write(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{file_field}"; filename="{safe_filename}"\r\n'
+            f"Content-Type: {content_type}\r\n\r\n".encode("utf-8")
+        )
+        tail = f"\r\n--{boundary}--\r\n".encode("utf-8")
+        self._length = head.tell() + file_size + len(tail)
+        head.seek(0)
+        self._parts = [head, fileobj, io.BytesIO(tail)]
+        self._limiter = limiter
+        self._watch = watch
+
+    def __len__(self):
+        return self._length
+
+    def read(self, size=-1):
+        data = b""
+        while self._parts and (size is None or size < 0 or len(data) < size):
+            chunk = self._parts[0].read(-1 if size is None or size < 0 else size - len(data))
+            if not chunk:
+                self._parts.pop(0)
+                continue
+            data += chunk
+        if not data and self._watch:
+            # The whole body has been sent. The wait for the storage server's reply is covered by
+            # the request's read timeout, so it must not count as a stall.
+            self._watch.pause()
+            return data
+        # The watch raises once the watchdog has given up on this upload, which aborts the request.
+        _charge(len(data), self._limiter, self._watch)
+        return data
@@ -1,6 +1,7 @@
 import os
 import queue
 import threading
+import time
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 from contextlib import redirect_stdout, redirect_stderr
@@ -19,6 +20,21 @@ from canvas_bulk_upload import (
 
 load_env_file()
 
+LOG_POLL_MS = 100
+# Scrollback kept in the log widget; older lines are trimmed as new ones arrive.
+MAX_LOG_LINES = 5000
+# Upper bound on queued messages rendered per tick, so a burst can't freeze the window.
+MAX_MESSAGES_PER_TICK = 2000
+
+
+def format_duration(seconds):
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h {seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m {seconds % 60:02d}s"
+    return f"{seconds}s"
+
 
 class QueueWriter:
     def __init__(self, q):
@@ -40,6 +56,10 @@ class App(tk.Tk):
         self.minsize(820, 620)
 
         self.log_queue = queue.Queue()
+        # Written by the worker thread, read by the Tk thread on each poll.
+        self.progress = None
+        self.task_started = None
+        self.task_done = False
         self._build_ui()
         self._poll_log_queue()
 
@@ -79,6 +99,12 @@ class App(tk.Tk):
         self.upload_btn = ttk.Button(actions, text="Upload OCRed PDFs", command=self._upload_clicked)
         self.upload_btn.pack(side=tk.LEFT)
 
+        self.progress_bar = ttk.Progressbar(container, mode="determinate", maximum=1)
+        self.progress_bar.pack(fill=tk.X)
+        self.progress_text = tk.StringVar(value="Idle")
+        progress_label = ttk.Label(container, textvariable=self.progress_text, foreground="#666666")
+        progress_label.pack(anchor="w", pady=(2, 8))
+
         log_label = ttk.Label(container, text="Log")
         log_label.pack(anchor="w")
 
@@ -156,6 +182,11 @@ class App(tk.Tk):
     def _run_task(self, func):
         self.download_btn.config(state="disabled")
         self.upload_btn.config(state="disabled")
+        self.progress = None
+        self.task_started = time.monotonic()
+        self.task_done = False
+        self.progress_bar.config(value=0, maximum=1)
+        self.progress_text.set("Starting...")
         thread = threading.Thread(target=func, daemon=True)
         thread.start()
 
@@ -171,6 +202,7 @@ class App(tk.Tk):
                     output_folder=self.output_folder.get().strip() or DEFAULT_OUTPUT_FOLDER,
                     file_id_column=self.file_id_column.get().strip() or "Id",
                     filename_column=self.filename_column.get().strip() or "Name",
+                    progress_cb=self._progress_cb,
                 )
         except Exception as exc:
             self._log(f"\n[ERROR] {exc}\n")
@@ -190,6 +222,7 @@ class App(tk.Tk):
                     ocr_folder=self.ocr_folder.get().strip() or DEFAULT_OCR_FOLDER,
                     file_id_col=self.file_id_column.get().strip() or "Id",
                     ocr_path_col=self.filename_column.get().strip() or "Name",
+                    progress_cb=self._progress_cb,
                 )
         except Exception as exc:
             self._log(f"\n[ERROR] {exc}\n")
@@ -198,23 +231,56 @@ class App(tk.Tk):
             self._enable_buttons()
 
     def _enable_buttons(self):
-        self.download_btn.config(state="normal")
-        self.upload_btn.config(state="normal")
+        # Called from the worker thread; the Tk thread re-enables the buttons on its next poll.
+        self.task_done = True
+
+    def _progress_cb(self, current, total, message):
+        self.progress = (current, total, message, time.monotonic())
 
     def _log(self, text):
         self.log_queue.put(text)
 
     def _poll_log_queue(self):
+        messages = []
         try:
-            while True:
-                msg = self.log_queue.get_nowait()
-                self.log_text.config(state="normal")
-                self.log_text.insert(tk.END, msg)
-                self.log_text.see(tk.END)
-                self.log_text.config(state="disabled")
+            while len(messages) < MAX_MESSAGES_PER_TICK:
+                messages.append(self.log_queue.get_nowait())
         except queue.Empty:
             pass
-        self.after(100, self._poll_log_queue)
+        if messages:
+            self._append_log("".join(messages))
+        self._update_progress()
+        if self.task_done:
+            self.task_done = False
+            self.download_btn.config(state="normal")
+            self.upload_btn.config(state="normal")
+        self.after(LOG_POLL_MS, self._poll_log_queue)
+
+    def _append_log(self, text):
+        # Only follow the output if the user hasn't scrolled up to read something.
+        at_bottom = self.log_text.yview()[1] >= 0.999
+        self.log_text.config(state="normal")
+        self.log_text.insert(tk.END, text)
+        line_count = int(self.log_text.index("end-1c").split(".")[0])
+        if line_count > MAX_LOG_LINES:
+            self.log_text.delete("1.0", f"{line_count - MAX_LOG_LINES + 1}.0")
+        self.log_text.config(state="disabled")
+        if at_bottom:
+            self.log_text.see(tk.END)
+
+    def _update_progress(self):
+        if not self.progress:
+            return
+        current, total, message, updated = self.progress
+        self.progress_bar.config(maximum=max(total, 1), value=current)
+        text = f"{current} / {total}  {message}"
+        elapsed = updated - self.task_started
+        if current and elapsed > 0:
+            rate = current / elapsed
+            text += f"  |  {rate * 60:.1f} rows/min"
+            if total > current:
+                text += f"  |  ETA {format_duration((total - current) / rate)}"
+        self.progress_text.set(text)
 
 
 if __name__ == "__main__":
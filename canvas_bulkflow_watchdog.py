@@ -0,0 +1,175 @@
+import socket
+import threading
+import time
+
+from canvas_bulkflow_retry import STALLED, TransientTransferError
+
+# ========== Defaults ==========
+
+# A transfer may take this long plus its size at DEFAULT_MIN_RATE before it is aborted.
+DEFAULT_DEADLINE_BASE = 120
+DEFAULT_MIN_RATE = 16 * 1024
+# ...and is aborted sooner if no bytes move for this long.
+DEFAULT_STALL_SECONDS = 120
+CHECK_INTERVAL = 1
+
+
+def abort_response(resp):
+    """
+    Unblocks a thread stuck reading a streamed requests response by shutting its socket down.
+    """
+    raw = getattr(resp, "raw", None)
+    if hasattr(raw, "shutdown"):
+        # urllib3 2.3+
+        raw.shutdown()
+        return
+    sock = getattr(getattr(raw, "connection", None), "sock", None)
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+class TransferWatch:
+    """
+    One watched transfer. The transfer calls ``progress(nbytes)`` as bytes move; once the
+    watchdog has aborted it, ``check()`` raises so the transfer stops at its next step.
+
+    Time between ``pause()`` and ``resume()`` (waiting on the shared bandwidth cap) counts
+    toward neither the stall limit nor the deadline: the transfer is slow by choice, not stuck.
+    An upload also pauses its watch once the body is sent, while the server processes it.
+    """
+
+    def __init__(self, label, deadline, stall_seconds, abort=None):
+        self.label = label
+        self.started = time.monotonic()
+        self.deadline = self.started + deadline
+        self.stall_seconds = stall_seconds
+        self.abort = abort
+        self.last_progress = self.started
+        self.transferred = 0
+        self.reason = None
+        self.paused_at = None
+
+    def pause(self):
+        self.paused_at = time.monotonic()
+
+    def resume(self):
+        now = time.monotonic()
+        if self.paused_at is not None:
+            self.deadline += now - self.paused_at
+            self.last_progress = now
+            self.paused_at = None
+
+    def progress(self, nbytes):
+        self.transferred += nbytes
+        self.last_progress = time.monotonic()
+        self.check()
+
+    def check(self):
+        if self.reason:
+            raise TransientTransferError(STALLED, f"{self.label} aborted: {self.reason}.")
+
+    def expired(self, now):
+        if self.paused_at is not None:
+            return None
+        if now > self.deadline:
+            return f"exceeded its {self.deadline - self.started:.0f}s deadline after {self.transferred} bytes"
+        if now - self.last_progress > self.stall_seconds:
+            return f"no progress for {now - self.last_progress:.0f}s after {self.transferred} bytes"
+        return None
+
+
+class TransferWatchdog:
+    """
+    Background thread that aborts transfers which blow their deadline or stop making progress.
+
+    Deadlines scale with the expected size (base + size / min_rate), so large files get the
+    time they need while a trickling server can't hold a worker for hours. An aborted transfer
+    surfaces as TransientTransferError("stalled"), which the retry queue requeues.
+
+    Downloads are cut off mid-read through ``abort``. Uploads have no socket to shut down, so
+    they stop at the next block they send; once the body is sent, waiting for the response is
+    bounded by the per-read request timeout instead.
+    """
+
+    def __init__(
+        self,
+        deadline_base=DEFAULT_DEADLINE_BASE,
+        min_rate=DEFAULT_MIN_RATE,
+        stall_seconds=DEFAULT_STALL_SECONDS,
+    ):
+        self.deadline_base = deadline_base
+        self.min_rate = min_rate
+        self.stall_seconds = stall_seconds
+        self.active = set()
+        self.stalls = []
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def deadline_for(self, expected_size, rate_cap=None):
+        min_rate = self.min_rate
+        if rate_cap:
+            # Leave room for a bandwidth cap shared with other transfers.
+            min_rate = min(min_rate, rate_cap / 4)
+        return self.deadline_base + (expected_size or 0) / min_rate
+
+    def watch(self, label, expected_size=None, abort=None, rate_cap=None):
+        return _WatchContext(self, TransferWatch(
+            label, self.deadline_for(expected_size, rate_cap), self.stall_seconds, abort
+        ))
+
+    def _start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="transfer-watchdog", daemon=True)
+                self.thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(CHECK_INTERVAL)
+            now = time.monotonic()
+            with self.lock:
+                watches = list(self.active)
+            for watch in watches:
+                if watch.reason:
+                    continue
+                reason = watch.expired(now)
+                if not reason:
+                    continue
+                watch.reason = reason
+                print(f"[Watchdog] {watch.label} {reason}. Aborting it.")
+                if watch.abort:
+                    try:
+                        watch.abort()
+                    except Exception as e:
+                        print(f"[Watchdog] Could not abort {watch.label}: {e}")
+
+    def print_summary(self):
+        if self.stalls:
+            print(f"Stalled transfers aborted by the watchdog: {len(self.stalls)}")
+            for label, reason in self.stalls:
+                print(f"  - {label}: {reason}")
+
+
+class _WatchContext:
+    def __init__(self, watchdog, watch):
+        self.watchdog = watchdog
+        self.watch = watch
+
+    def __enter__(self):
+        self.watchdog._start()
+        with self.watchdog.lock:
+            self.watchdog.active.add(self.watch)
+        return self.watch
+
+    def __exit__(self, exc_type, exc, tb):
+        with self.watchdog.lock:
+            self.watchdog.active.discard(self.watch)
+        if self.watch.reason:
+            self.watchdog.stalls.append((self.watch.label, self.watch.reason))
+            if exc_type is not None and not isinstance(exc, TransientTransferError):
+                # Whatever the aborted socket raised, report it as a stall so it is requeued.
+                raise TransientTransferError(STALLED, f"{self.watch.label} aborted: {self.watch.reason}.") from exc
+        return False
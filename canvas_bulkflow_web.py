@@ -1,14 +1,19 @@
+import argparse
 import io
+import multiprocessing
 import os
 import tempfile
 import threading
 import traceback
 import uuid
-from contextlib import redirect_stdout, redirect_stderr
+from collections import deque
+from contextlib import nullcontext, redirect_stdout, redirect_stderr
 from datetime import datetime
 
-from flask import Flask, jsonify, render_template_string, request
+from flask import Flask, jsonify, render_template_string, request, send_from_directory
+from canvas_bulkflow_bandwidth import BandwidthLimiter, limiter_from_settings
 from canvas_bulkflow_config import load_env_file
+from canvas_bulkflow_feeder import HotFolderFeeder
 
 from canvas_bulk_download import (
     run_download,
@@ -19,6 +24,12 @@ from canvas_bulk_upload import (
     bulk_replace_ocr_files,
     DEFAULT_OCR_FOLDER,
 )
+from canvas_bulkflow_layout import DEFAULT_LAYOUT, LAYOUTS, run_file_path
+from canvas_bulkflow_manifest import DEFAULT_MANIFEST_FILENAME
+from canvas_bulkflow_profiler import JobProfiler, default_profile_folder
+from canvas_bulkflow_scheduler import DEFAULT_ORDER, DEFAULT_WORKERS, MAX_WORKERS, ORDERS
+from canvas_bulkflow_shard import parse_shard
+from canvas_bulkflow_textlayer import HAS_TEXT_LIST_FILENAME
 
 
 app = Flask(__name__)
@@ -26,6 +37,42 @@ load_env_file()
 
 JOBS = {}
 JOBS_LOCK = threading.Lock()
+# Lines of output kept per job; older lines are dropped so a long job's log stays small.
+MAX_LOG_LINES = 5000
+
+# Shared by every job so CANVAS_BANDWIDTH_LIMIT caps the app's total transfer rate.
+try:
+    LIMITER = limiter_from_settings()
+except ValueError as e:
+    print(f"Ignoring bandwidth settings: {e}")
+    LIMITER = BandwidthLimiter()
+
+
+class JobLog:
+    """
+    The last MAX_LOG_LINES lines of a job's output.
+    """
+
+    def __init__(self, max_lines=MAX_LOG_LINES):
+        self.lines = deque(maxlen=max_lines)
+        self.partial = ""
+        self.dropped = 0
+
+    def write(self, msg):
+        *complete, self.partial = (self.partial + msg).split("\n")
+        overflow = len(self.lines) + len(complete) - self.lines.maxlen
+        if overflow > 0:
+            self.dropped += overflow
+        self.lines.extend(complete)
+
+    def text(self):
+        lines = list(self.lines)
+        if self.partial:
+            lines.append(self.partial)
+        text = "\n".join(lines)
+        if self.dropped:
+            text = f"[... {self.dropped} earlier lines not shown ...]\n" + text
+        return text
 
 
 class JobLogWriter:
@@ -38,7 +85,7 @@ class JobLogWriter:
         with JOBS_LOCK:
             job = JOBS.get(self.job_id)
             if job:
-                job["log"] += msg
+                job["log"].write(msg)
 
     def flush(self):
         pass
@@ -55,14 +102,18 @@ def update_progress(job_id, current, total, message):
 
 def run_job(job_id, action, csv_path, params):
     writer = JobLogWriter(job_id)
+    profiler = None
+    if params["profile"]:
+        profiler = JobProfiler(default_profile_folder(params["output_folder"]), action)
     with JOBS_LOCK:
         job = JOBS.get(job_id)
         if job:
             job["status"] = "running"
             job["message"] = "Starting..."
+            job["profiler"] = profiler
 
     try:
-        with redirect_stdout(writer), redirect_stderr(writer):
+        with redirect_stdout(writer), redirect_stderr(writer), profiler or nullcontext():
             if action == "download":
                 run_download(
                     csv_file=csv_path,
@@ -71,6 +122,15 @@ def run_job(job_id, action, csv_path, params):
                     output_folder=params["output_folder"],
                     file_id_column=params["file_id_column"],
                     filename_column=params["filename_column"],
+                    layout=params["layout"],
+                    detect_text=params["detect_text"],
+                    incremental=params["incremental"],
+                    feeder=HotFolderFeeder(params["output_folder"], params["ocr_folder"]) if params["feed"] else None,
+                    shard=params["shard"],
+                    workers=params["workers"],
+                    order=params["order"],
+                    limiter=LIMITER,
+                    profiler=profiler,
                     progress_cb=lambda c, t, m: update_progress(job_id, c, t, m),
                 )
             elif action == "upload":
@@ -81,6 +141,14 @@ def run_job(job_id, action, csv_path, params):
                     ocr_folder=params["ocr_folder"],
                     file_id_col=params["file_id_column"],
                     ocr_path_col=params["filename_column"],
+                    layout=params["layout"],
+                    has_text_list=run_file_path(params["output_folder"], HAS_TEXT_LIST_FILENAME),
+                    manifest_path=run_file_path(params["output_folder"], DEFAULT_MANIFEST_FILENAME),
+                    shard=params["shard"],
+                    workers=params["workers"],
+                    order=params["order"],
+                    limiter=LIMITER,
+                    profiler=profiler,
                     progress_cb=lambda c, t, m: update_progress(job_id, c, t, m),
                 )
             else:
@@ -89,8 +157,8 @@ def run_job(job_id, action, csv_path, params):
         with JOBS_LOCK:
             job = JOBS.get(job_id)
             if job:
-                job["log"] += "\n[ERROR] Unexpected failure:\n"
-                job["log"] += traceback.format_exc()
+                job["log"].write("\n[ERROR] Unexpected failure:\n")
+                job["log"].write(traceback.format_exc())
     finally:
         with JOBS_LOCK:
             job = JOBS.get(job_id)
@@ -138,7 +206,7 @@ PAGE = """
       .card { background: var(--card); border: 1px solid var(--border); border-radius: 16px; padding: 18px; }
       .card h2 { margin: 0 0 12px; font-size: 16px; color: var(--accent); letter-spacing: 0.6px; text-transform: uppercase; }
       label { display: block; font-weight: 600; margin-bottom: 6px; }
-      input[type="text"], input[type="file"] {
+      input[type="text"], input[type="file"], select {
         width: 100%; padding: 10px 12px; border-radius: 10px;
         border: 1px solid #253041; background: #0b1220; color: var(--text);
         min-width: 0;
@@ -198,6 +266,42 @@ PAGE = """
               <label>OCRed folder</label>
               <input type="text" name="ocr_folder" value="{{ ocr_folder }}">
             </div>
+            <div class="row">
+              <label>Folder layout</label>
+              <select name="layout">
+                {% for option in layouts %}
+                <option value="{{ option }}" {% if option == layout %}selected{% endif %}>{{ option }}</option>
+                {% endfor %}
+              </select>
+            </div>
+            <div class="row">
+              <label>Shard (optional, e.g. 2/4 = this machine's share of 4)</label>
+              <input type="text" name="shard" value="" placeholder="1/1">
+            </div>
+            <div class="row">
+              <label>Parallel transfers (1-{{ max_workers }})</label>
+              <input type="number" name="workers" value="{{ workers }}" min="1" max="{{ max_workers }}">
+            </div>
+            <div class="row">
+              <label>Work order</label>
+              <select name="order">
+                {% for option in orders %}
+                <option value="{{ option }}" {% if option == order %}selected{% endif %}>{{ option }}</option>
+                {% endfor %}
+              </select>
+            </div>
+            <div class="row">
+              <label><input type="checkbox" name="detect_text" value="1"> Keep PDFs that already have text out of OCR</label>
+            </div>
+            <div class="row">
+              <label><input type="checkbox" name="incremental" value="1"> Only download rows that are new or changed since the last report</label>
+            </div>
+            <div class="row">
+              <label><input type="checkbox" name="feed" value="1"> Feed the hot folder in batches at Abbyy's OCR rate</label>
+            </div>
+            <div class="row">
+              <label><input type="checkbox" name="profile" value="1"> Profile this job (CPU and memory reports)</label>
+            </div>
             <div class="row">
               <label>File ID column</label>
               <input type="text" name="file_id_column" value="{{ file_id_column }}">
@@ -222,6 +326,7 @@ PAGE = """
           </div>
           <div style="margin-top: 14px; font-weight: 600;">Log</div>
           <pre id="logBox"></pre>
+          <div id="profileLinks" style="margin-top: 10px;"></div>
         </div>
       </div>
     </div>
@@ -234,6 +339,7 @@ PAGE = """
       const processed = document.getElementById("processed");
       const total = document.getElementById("total");
       const logBox = document.getElementById("logBox");
+      const profileLinks = document.getElementById("profileLinks");
       let currentJob = null;
       let pollTimer = null;
       let startInFlight = false;
@@ -247,6 +353,7 @@ PAGE = """
         formData.append("action", action);
         statusText.textContent = "Starting...";
         logBox.textContent = "";
+        profileLinks.textContent = "";
         try {
           const resp = await fetch("/start", { method: "POST", body: formData });
           if (!resp.ok) {
@@ -280,6 +387,11 @@ PAGE = """
         processed.textContent = data.current || 0;
         total.textContent = data.total || 0;
         logBox.textContent = data.log || "";
+        if (data.profile_files && data.profile_files.length) {
+          profileLinks.innerHTML = "Profile reports: " + data.profile_files.map(
+            (name) => `<a href="/profile/${currentJob}/${encodeURIComponent(name)}">${name}</a>`
+          ).join(" ");
+        }
 
         let pct = 0;
         if (data.total > 0) pct = Math.min(100, Math.round((data.current / data.total) * 100));
@@ -325,6 +437,12 @@ def index():
         ocr_folder=DEFAULT_OCR_FOLDER,
         file_id_column="Id",
         filename_column="Name",
+        layouts=LAYOUTS,
+        layout=DEFAULT_LAYOUT,
+        workers=DEFAULT_WORKERS,
+        max_workers=MAX_WORKERS,
+        orders=ORDERS,
+        order=DEFAULT_ORDER,
     )
 
 
@@ -346,6 +464,28 @@ def start():
     ocr_folder = request.form.get("ocr_folder", "").strip() or DEFAULT_OCR_FOLDER
     file_id_column = request.form.get("file_id_column", "").strip() or "Id"
     filename_column = request.form.get("filename_column", "").strip() or "Name"
+    layout = request.form.get("layout", "").strip() or DEFAULT_LAYOUT
+    if layout not in LAYOUTS:
+        return "Invalid folder layout.", 400
+    detect_text = request.form.get("detect_text") == "1"
+    feed = request.form.get("feed") == "1"
+    profile = request.form.get("profile") == "1"
+    incremental = request.form.get("incremental") == "1"
+    shard = None
+    if request.form.get("shard", "").strip():
+        try:
+            shard = parse_shard(request.form["shard"].strip())
+        except argparse.ArgumentTypeError as e:
+            return str(e), 400
+    try:
+        workers = int(request.form.get("workers", "").strip() or DEFAULT_WORKERS)
+    except ValueError:
+        return "Parallel transfers must be a whole number.", 400
+    if not 1 <= workers <= MAX_WORKERS:
+        return f"Parallel transfers must be between 1 and {MAX_WORKERS}.", 400
+    order = request.form.get("order", "").strip() or DEFAULT_ORDER
+    if order not in ORDERS:
+        return "Invalid work order.", 400
 
     with tempfile.NamedTemporaryFile(delete=False, suffix=".csv") as tmp:
         tmp.write(csv_file.read())
@@ -359,7 +499,7 @@ def start():
             "message": "Queued",
             "current": 0,
             "total": 0,
-            "log": "",
+            "log": JobLog(),
             "started_at": datetime.utcnow().isoformat() + "Z",
         }
 
@@ -370,6 +510,14 @@ def start():
         "ocr_folder": ocr_folder,
         "file_id_column": file_id_column,
         "filename_column": filename_column,
+        "layout": layout,
+        "detect_text": detect_text,
+        "feed": feed,
+        "profile": profile,
+        "incremental": incremental,
+        "shard": shard,
+        "workers": workers,
+        "order": order,
     }
 
     thread = threading.Thread(target=run_job, args=(job_id, action, tmp_path, params), daemon=True)
@@ -378,18 +526,42 @@ def start():
     return jsonify({"job_id": job_id})
 
 
+def job_status(job):
+    fields = {key: value for key, value in job.items() if key != "profiler"}
+    fields["log"] = job["log"].text()
+    if job.get("profiler"):
+        fields["profile_files"] = job["profiler"].files()
+    return jsonify(fields)
+
+
 @app.route("/status/<job_id>", methods=["GET"])
 def status(job_id):
     with JOBS_LOCK:
         job = JOBS.get(job_id)
         if not job:
             return jsonify({"status": "missing"}), 404
-        return jsonify(job)
+        # A profiled job's status requests (log joining, JSON) show up in its CPU report.
+        if job.get("profiler"):
+            return job["profiler"].call_serialized(job_status, job)
+        return job_status(job)
+
+
+@app.route("/profile/<job_id>/<name>", methods=["GET"])
+def profile_file(job_id, name):
+    with JOBS_LOCK:
+        job = JOBS.get(job_id)
+        profiler = job.get("profiler") if job else None
+    if not profiler or name not in profiler.files():
+        return "Profile report not found.", 404
+    return send_from_directory(profiler.folder, name, as_attachment=True)
 
 
 if __name__ == "__main__":
     import webbrowser
 
+    # The text layer check uses a process pool, which needs this in the frozen Windows build.
+    multiprocessing.freeze_support()
+
     def open_browser():
         webbrowser.open("http://127.0.0.1:5000")
 
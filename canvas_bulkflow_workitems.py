@@ -0,0 +1,133 @@
+import time
+
+import pandas as pd
+
+from canvas_bulkflow_retry import TransientTransferError
+
+# ========== Work Items ==========
+#
+# The transfer loops used to carry a pandas Series per row (from df.iterrows) through the
+# retry queue and result lists. A WorkItem keeps only what they read, in __slots__; the full
+# CSV row is rebuilt from the DataFrame on demand, which only happens for the failure report.
+
+STATUS_PENDING = "pending"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+STATUS_SKIPPED = "skipped"
+STATUS_DUPLICATE = "duplicate"
+STATUS_HAS_TEXT = "has-text"
+
+
+class WorkItem:
+    """
+    One CSV row to transfer. Also acts as a read-only mapping of the original CSV row
+    (``item[column]``, ``item.get(column)``, ``dict(item)``), read back from the DataFrame.
+    """
+
+    __slots__ = (
+        "index", "position", "file_id", "name", "course_id", "size",
+        "path", "digest", "status", "elapsed", "source",
+    )
+
+    def __init__(self, source, position, index, file_id, name, course_id=None, size=None):
+        self.source = source
+        self.position = position
+        self.index = index
+        self.file_id = file_id
+        self.name = name
+        self.course_id = course_id
+        self.size = size
+        self.path = None
+        self.digest = None
+        self.status = STATUS_PENDING
+        self.elapsed = 0.0
+
+    def __repr__(self):
+        return f"WorkItem(index={self.index!r}, file_id={self.file_id!r}, status={self.status!r})"
+
+    def keys(self):
+        return self.source.columns
+
+    def __getitem__(self, column):
+        return self.source.value(self.position, column)
+
+    def get(self, column, default=None):
+        if column not in self.source.column_positions:
+            return default
+        return self[column]
+
+
+def _column_values(df, column, count):
+    return df[column].tolist() if column and column in df.columns else [None] * count
+
+
+def _id_values(df, column, count, minimum):
+    """
+    Column as a list of ints, None where the value is missing, not numeric or below ``minimum``.
+    """
+    if not column or column not in df.columns:
+        return [None] * count
+    values = pd.to_numeric(df[column], errors="coerce")
+    return [int(v) if v == v and v >= minimum else None for v in values.tolist()]
+
+
+class WorkList:
+    """
+    WorkItems for every row of ``df``, built column-wise instead of row by row.
+    """
+
+    def __init__(self, df, file_id_column, name_column, course_id_column=None, size_column=None):
+        self.df = df
+        self.columns = list(df.columns)
+        self.column_positions = {column: i for i, column in enumerate(self.columns)}
+        count = len(df)
+        self.items = []
+        for position, (index, file_id, name, course_id, size) in enumerate(zip(
+            df.index,
+            _column_values(df, file_id_column, count),
+            _column_values(df, name_column, count),
+            # Same validity rules as row_context: course ids are positive, sizes non-negative.
+            _id_values(df, course_id_column, count, 1),
+            _id_values(df, size_column, count, 0),
+        )):
+            self.items.append(WorkItem(self, position, index, file_id, name, course_id, size))
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def value(self, position, column):
+        return self.df.iat[position, self.column_positions[column]]
+
+    def run(self, item, process):
+        """
+        Calls ``process(item)``, timing it and setting the item's status from the result.
+        TransientTransferError is re-raised for the retry queue (the item stays "failed"
+        until a retry succeeds).
+        """
+        started = time.perf_counter()
+        try:
+            result = process(item)
+        except TransientTransferError:
+            item.status = STATUS_FAILED
+            raise
+        finally:
+            item.elapsed += time.perf_counter() - started
+        item.status = STATUS_DONE if result else STATUS_FAILED
+        return result
+
+    def with_status(self, status):
+        return [item for item in self.items if item.status == status]
+
+    def count(self, status):
+        return sum(1 for item in self.items if item.status == status)
+
+    def print_timings(self):
+        timed = [item for item in self.items if item.elapsed]
+        if len(timed) < 2:
+            return
+        slowest = max(timed, key=lambda item: item.elapsed)
+        average = sum(item.elapsed for item in timed) / len(timed)
+        print(f"Average time per file: {average:.1f}s (slowest: {slowest.name}, {slowest.elapsed:.1f}s)")